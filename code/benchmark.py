@@ -0,0 +1,261 @@
+import os, sys, json, math, time, argparse, subprocess, resource, tracemalloc
+import numpy as np
+import pygame
+from settings import *
+from controls import controls
+from headless import Simulation
+from soil import FARMABLE
+from support import asset_report
+
+# 确定性场景基准测试：用固定的按键脚本和随机种子驱动Level，统计帧时间
+# 用法: python benchmark.py [场景...] [--output 结果.json] [--compare 旧结果.json]
+
+# 场景脚本是生成器：每yield一个阶段名推进一帧；
+# yield (阶段名, 函数) 则计时该函数（如进入新的一天）代替一帧
+
+def hold(keys, frames, phase):
+    controls.hold(keys)
+    for _ in range(frames):
+        yield phase
+
+def tap(keys, phase, wait = 0):
+    yield from hold(keys, 1, phase)
+    yield from hold([], wait, phase)
+
+# 把玩家直接放到某个位置（脚本的准备步骤，不是输入）
+def place_player(level, pos, facing = 'down'):
+    player = level.player
+    player.pos.update(pos)
+    player.rect.center = (round(pos[0]), round(pos[1]))
+    player.hitbox.center = player.rect.center
+    player.status = facing + '_idle'
+
+# 站在图格上方，使工具目标点正好落在图格中心
+def face_cell(level, cell):
+    x, y = (cell[0] + 0.5) * TILE_SIZE, (cell[1] + 0.5) * TILE_SIZE
+    place_player(level, (x - PLAYER_TOOL_OFFSET['down'].x, y - PLAYER_TOOL_OFFSET['down'].y))
+
+# 按空格使用手持物，等待工具动画结束
+def use_hand(level, phase):
+    yield from tap([pygame.K_SPACE], phase)
+    while level.player.timers['tool use'].active or level.player.timers['seed use'].active:
+        yield phase
+
+# 选择工具/种子的数字键
+def select(key, phase):
+    yield from tap([key], phase, 12)
+
+# 场地：可耕地最多的 size x size 区域中的可耕地图格（按行排列）
+def field_cells(level, size):
+    farmable = (level.soil_layer.grid & FARMABLE) != 0
+    sums = np.pad(farmable.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+    counts = sums[size:, size:] - sums[:-size, size:] - sums[size:, :-size] + sums[:-size, :-size]
+    top, left = np.unravel_index(np.argmax(counts), counts.shape)
+    window = farmable[top:top + size, left:left + size]
+    return [(left + col, top + row) for row, col in np.argwhere(window).tolist()]
+
+def interaction_center(level, name):
+    for sprite in level.interaction_sprites:
+        if sprite.name == name:
+            return sprite.rect.center
+
+def scenario_walk(level, args):
+    yield from hold([pygame.K_RIGHT], 300, 'right')
+    yield from hold([pygame.K_UP], 150, 'up')
+    yield from hold([pygame.K_LEFT], 300, 'left')
+    yield from hold([pygame.K_DOWN], 150, 'down')
+
+def till_and_water(level, cells):
+    yield from select(pygame.K_1, 'till')
+    for cell in cells:
+        face_cell(level, cell)
+        yield from use_hand(level, 'till')
+
+    yield from select(pygame.K_3, 'water')
+    for cell in cells:
+        face_cell(level, cell)
+        yield from use_hand(level, 'water')
+
+def scenario_farm(level, args):
+    yield from till_and_water(level, field_cells(level, args.field))
+
+def scenario_harvest(level, args):
+    cells = field_cells(level, args.field // 2)
+    yield from till_and_water(level, cells)
+
+    level.player.seed_inventory['corn'] = len(cells)
+    yield from select(pygame.K_4, 'plant')
+    for cell in cells:
+        face_cell(level, cell)
+        yield from use_hand(level, 'plant')
+
+    # 玉米生长需要几天，每天都当作下雨浇水
+    for _ in range(4):
+        yield 'new day', level.reset
+        yield 'new day', level.soil_layer.water_all
+
+    # 走过每一株植物收获
+    for cell in cells:
+        place_player(level, ((cell[0] + 0.5) * TILE_SIZE, (cell[1] + 0.5) * TILE_SIZE))
+        yield from hold([], 2, 'harvest')
+
+def scenario_rain(level, args):
+    level.raining = True
+    level.soil_layer.raining = True
+    for _ in range(3):
+        yield from hold([pygame.K_RIGHT], 200, 'rain')
+        yield from hold([pygame.K_LEFT], 200, 'rain')
+
+def scenario_shop(level, args):
+    level.player.item_inventory.update({'wood': 20, 'apple': 20, 'corn': 20, 'tomato': 20})
+    place_player(level, interaction_center(level, 'Trader'))
+    yield from tap([pygame.K_RETURN], 'open')
+
+    # 卖出、买入若干次
+    for _ in range(12):
+        for key in (pygame.K_DOWN, pygame.K_SPACE):
+            yield from tap([key], 'shop', 12)
+    yield from hold([], 120, 'shop')
+    yield from tap([pygame.K_ESCAPE], 'close', 12)
+
+def scenario_sleep(level, args):
+    bed = interaction_center(level, 'Bed')
+    for _ in range(args.days):
+        place_player(level, bed)
+        yield from tap([pygame.K_RETURN], 'sleep')
+        while level.player.sleep:
+            yield 'sleep'
+
+SCENARIOS = {
+    'walk': scenario_walk,
+    'farm': scenario_farm,
+    'harvest': scenario_harvest,
+    'rain': scenario_rain,
+    'shop': scenario_shop,
+    'sleep': scenario_sleep,
+}
+
+# 帧时间统计（毫秒）
+def summarize(times):
+    ordered = sorted(times)
+    count = len(ordered)
+    def percentile(p):
+        return ordered[min(count - 1, max(0, math.ceil(p / 100 * count) - 1))]
+    return {
+        'frames': count,
+        'total': sum(ordered),
+        'mean': sum(ordered) / count,
+        'p50': percentile(50),
+        'p95': percentile(95),
+        'p99': percentile(99),
+        'max': ordered[-1]}
+
+# 在当前进程中运行一个场景
+def run_scenario(name, args):
+    # 启动时间：从开始加载到第一帧描绘完成
+    start = time.perf_counter()
+    simulation = Simulation(dt = args.dt, render_every = 0 if args.no_render else 1, seed = args.seed)
+    level = simulation.level
+    level.draw()
+    first_frame = (time.perf_counter() - start) * 1000
+    if args.trace_memory:
+        tracemalloc.start()
+
+    times = []
+    phases = {}
+    for step in SCENARIOS[name](level, args):
+        phase, action = step if isinstance(step, tuple) else (step, simulation.step)
+        start = time.perf_counter()
+        action()
+        elapsed = (time.perf_counter() - start) * 1000
+        times.append(elapsed)
+        phases.setdefault(phase, []).append(elapsed)
+        pygame.event.pump()
+    controls.use_keyboard()
+
+    result = {
+        'frame_ms': summarize(times),
+        'phases': {phase: summarize(phase_times) for phase, phase_times in phases.items()},
+        'first_frame_ms': first_frame,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'asset_kb': {category: size // 1024 for category, size in asset_report().items()}}
+    if args.trace_memory:
+        result['peak_python_heap_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    return result
+
+# 每个场景在单独的子进程中运行，互不影响（内存峰值、游戏状态）
+def run_in_subprocess(name, argv):
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT = '1')
+    command = [sys.executable, os.path.abspath(__file__), name, '--child'] + argv
+    output = subprocess.run(command, env = env, capture_output = True, text = True, check = True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output = True, text = True).stdout.strip()
+    except OSError:
+        return ''
+
+def print_results(results):
+    print(f'{"scenario":<10}{"frames":>8}{"mean":>9}{"p50":>9}{"p95":>9}{"p99":>9}{"rss MB":>9}{"start ms":>10}')
+    for name, result in results['scenarios'].items():
+        frame = result['frame_ms']
+        print(f'{name:<10}{frame["frames"]:>8}{frame["mean"]:>9.3f}{frame["p50"]:>9.3f}'
+            f'{frame["p95"]:>9.3f}{frame["p99"]:>9.3f}{result["peak_rss_kb"] / 1024:>9.1f}{result["first_frame_ms"]:>10.1f}')
+        for phase, stats in result['phases'].items():
+            print(f'  {phase:<8}{stats["frames"]:>8}{stats["mean"]:>9.3f}{stats["p50"]:>9.3f}{stats["p95"]:>9.3f}{stats["p99"]:>9.3f}')
+        assets = result.get('asset_kb', {})
+        print(f'  assets {sum(assets.values()) / 1024:.1f} MB: ' + ', '.join(f'{category} {size / 1024:.1f}' for category, size in assets.items()))
+
+def print_comparison(old, new):
+    print(f'\n{"scenario":<10}{"mean old":>10}{"mean new":>10}{"change":>9}{"p95 old":>10}{"p95 new":>10}{"change":>9}')
+    for name, result in new['scenarios'].items():
+        if name not in old['scenarios']:
+            continue
+        before, after = old['scenarios'][name]['frame_ms'], result['frame_ms']
+        mean_change = (after['mean'] / before['mean'] - 1) * 100
+        p95_change = (after['p95'] / before['p95'] - 1) * 100
+        print(f'{name:<10}{before["mean"]:>10.3f}{after["mean"]:>10.3f}{mean_change:>+8.1f}%'
+            f'{before["p95"]:>10.3f}{after["p95"]:>10.3f}{p95_change:>+8.1f}%')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'deterministic scenario benchmarks (headless)')
+    parser.add_argument('scenarios', nargs = '*', help = f'scenarios to run: {", ".join(SCENARIOS)} (default: all)')
+    parser.add_argument('--seed', type = int, default = 1)
+    parser.add_argument('--dt', type = float, default = 1 / TICK_RATE, help = 'simulated seconds per frame')
+    parser.add_argument('--field', type = int, default = 20, help = 'side of the farm field in tiles')
+    parser.add_argument('--days', type = int, default = 5, help = 'days to sleep through')
+    parser.add_argument('--no-render', action = 'store_true', help = 'measure simulation only')
+    parser.add_argument('--trace-memory', action = 'store_true', help = 'also report the Python heap peak (slow)')
+    parser.add_argument('--output', help = 'write results as JSON')
+    parser.add_argument('--compare', help = 'JSON results of an earlier run to compare against')
+    parser.add_argument('--child', action = 'store_true', help = argparse.SUPPRESS)
+    args = parser.parse_args()
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f'unknown scenario {name!r}')
+
+    if args.child:
+        print(json.dumps(run_scenario(args.scenarios[0], args)))
+        sys.exit()
+
+    argv = ['--seed', str(args.seed), '--dt', repr(args.dt), '--field', str(args.field), '--days', str(args.days)]
+    argv += ['--no-render'] * args.no_render + ['--trace-memory'] * args.trace_memory
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'python': sys.version.split()[0],
+            'pygame': pygame.version.ver,
+            'seed': args.seed,
+            'dt': args.dt,
+            'render': not args.no_render},
+        'scenarios': {name: run_in_subprocess(name, argv) for name in (args.scenarios or SCENARIOS)}}
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent = 2)
+    if args.compare:
+        with open(args.compare) as file:
+            print_comparison(json.load(file), results)
@@ -0,0 +1,102 @@
+import pygame
+from settings import *
+from support import world_surfaces
+from spatial import refresh
+
+# 预烘焙块：把一块区域内的静态图块合成一张surface，一次blit描绘
+class Chunk(pygame.sprite.Sprite):
+    def __init__(self, pos, size, z, layer_count, groups):
+        super().__init__(groups)
+        self.area = pygame.Rect(pos, size) # 块负责的区域
+        self.rect = self.area.copy()
+        self.z = z
+        self.layer_count = layer_count
+
+        # 图块位置(像素) -> 每个图层一个surf，按图层顺序烘焙
+        self.tiles = {}
+        self.baked = None
+
+    # 描绘时才烘焙（图块改变后按需重新烘焙）
+    @property
+    def image(self):
+        if self.baked is None:
+            self.bake()
+        return self.baked
+
+    # 设置图块后调用 fit 更新rect（批量设置时只调用一次）
+    def set_tile(self, layer_index, pos, surf):
+        if pos not in self.tiles:
+            self.tiles[pos] = [None] * self.layer_count
+        self.tiles[pos][layer_index] = surf
+        if not any(self.tiles[pos]):
+            del self.tiles[pos]
+        self.baked = None
+
+    # 块的rect缩小到图块的包围盒，减少透明区域的blit
+    def fit(self):
+        if self.tiles:
+            rects = [surf.get_rect(topleft = pos) for pos, surfs in self.tiles.items() for surf in surfs if surf]
+            self.rect = rects[0].unionall(rects[1:]).clip(self.area)
+        self.baked = None
+
+    def bake(self):
+        self.baked = pygame.Surface(self.rect.size, pygame.SRCALPHA).convert_alpha()
+        for (x, y), surfs in self.tiles.items():
+            for surf in surfs:
+                if surf:
+                    self.baked.blit(surf, (x - self.rect.x, y - self.rect.y))
+        world_surfaces[self] = self.baked
+
+    def kill(self):
+        super().kill()
+        world_surfaces.pop(self, None)
+
+# 静态图层的块缓存
+class TileChunks:
+    def __init__(self, groups, z, layers, chunk_size = (CHUNK_SIZE, CHUNK_SIZE)):
+        self.groups = groups
+        self.z = z
+        self.layers = layers # 图层名，靠前的先描绘
+        self.chunk_size = chunk_size
+        self.chunks = {} # (块x, 块y) -> Chunk
+
+    # 设置/替换图块，surf为None时移除；所在块在下次描绘时重新烘焙
+    def set_tile(self, layer, x, y, surf):
+        self.set_tiles([(layer, x, y, surf)])
+
+    # 批量设置图块 (图层, x, y, surf)，每个受影响的块只更新一次rect
+    def set_tiles(self, tiles):
+        touched = {}
+        for layer, x, y, surf in tiles:
+            pos = (x * TILE_SIZE, y * TILE_SIZE)
+            key = (pos[0] // self.chunk_size[0], pos[1] // self.chunk_size[1])
+            chunk = self.chunks.get(key)
+            if chunk is None:
+                if surf is None:
+                    continue
+                chunk_pos = (key[0] * self.chunk_size[0], key[1] * self.chunk_size[1])
+                chunk = Chunk(chunk_pos, self.chunk_size, self.z, len(self.layers), self.groups)
+                self.chunks[key] = chunk
+            chunk.set_tile(self.layers.index(layer), pos, surf)
+            touched[key] = chunk
+
+        for key, chunk in touched.items():
+            if not chunk.tiles:
+                chunk.kill()
+                del self.chunks[key]
+            else:
+                chunk.fit()
+                refresh(chunk) # rect可能改变
+
+    # 移除区域（像素）内的所有块，区域与块的边界对齐（按块卸载）
+    def remove_area(self, area):
+        for key, chunk in list(self.chunks.items()):
+            if area.contains(chunk.area):
+                chunk.kill()
+                del self.chunks[key]
+
+    # 烘焙还没烘焙的块（加载时进行，避免第一次描绘时卡顿）
+    def bake(self):
+        for chunk in self.chunks.values():
+            if chunk.baked is None:
+                chunk.bake()
@@ -0,0 +1,54 @@
+import pygame
+import numpy as np
+from settings import *
+from spatial import SpatialHash
+
+# 静态碰撞：碰撞图层（Collision、Fence）在加载时编译成合并后的矩形，不再每个图块一个sprite
+
+# 单个图块的碰撞箱，与 Generic 相同：宽度缩小20%，高度缩小75%，居中
+TILE_HITBOX = pygame.Rect(0, 0, TILE_SIZE, TILE_SIZE).inflate(-TILE_SIZE * 0.2, -TILE_SIZE * 0.75)
+
+# 把相邻的图块合并成尽量少的矩形（图格坐标）：先找出每行的连续图块，
+# 再把上下相邻、左右范围相同的行段合并；mask 为二维布尔数组
+def merge_tiles(mask):
+    rows, cols = mask.shape
+    rects = []
+    open_runs = {} # (左, 右) -> 开始的行
+    for y in range(rows):
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], mask[y].astype(np.int8), [0]))))
+        runs = {}
+        for left, right in zip(edges[::2].tolist(), edges[1::2].tolist()):
+            runs[(left, right)] = open_runs.pop((left, right), y)
+        for (left, right), top in open_runs.items(): # 没有延续到这一行的矩形
+            rects.append((left, top, right - left, y - top))
+        open_runs = runs
+    for (left, right), top in open_runs.items():
+        rects.append((left, top, right - left, rows - top))
+    return rects
+
+# 合并后的图块块的碰撞箱：边缘与块中外侧图块的碰撞箱相同；
+# 图块碰撞箱之间的空隙（横向12、纵向48像素）比玩家的碰撞箱小，填上后碰撞结果不变
+def block_hitbox(left, top, width, height):
+    return pygame.Rect(
+        left * TILE_SIZE + TILE_HITBOX.left,
+        top * TILE_SIZE + TILE_HITBOX.top,
+        width * TILE_SIZE - (TILE_SIZE - TILE_HITBOX.width),
+        height * TILE_SIZE - (TILE_SIZE - TILE_HITBOX.height))
+
+def compile_collision(tmx_data, layer_names):
+    mask = np.zeros((tmx_data.height, tmx_data.width), bool)
+    for name in layer_names:
+        layer = tmx_data.get_layer_by_name(name)
+        mask |= np.frombuffer(layer.mask(), np.uint8).reshape(layer.height, layer.width) != 0
+    return [block_hitbox(*block) for block in merge_tiles(mask)]
+
+# 静态碰撞箱：只保存矩形，用空间索引查询附近的矩形
+class StaticCollision:
+    def __init__(self, rects):
+        self.rects = rects
+        self.index = SpatialHash()
+        for number, rect in enumerate(rects):
+            self.index.insert(number, rect)
+
+    def query(self, rect):
+        return [self.rects[number] for number in self.index.query(rect)]
@@ -0,0 +1,46 @@
+import pygame
+
+# 游戏读取的按键（录像中每帧保存为一个位掩码）
+GAME_KEYS = (
+    pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT,
+    pygame.K_SPACE, pygame.K_RETURN, pygame.K_ESCAPE,
+    pygame.K_1, pygame.K_2, pygame.K_3, pygame.K_4, pygame.K_5)
+
+def key_mask(keys):
+    mask = 0
+    for bit, key in enumerate(GAME_KEYS):
+        if keys[key]:
+            mask |= 1 << bit
+    return mask
+
+# 固定的按键状态，可像 pygame.key.get_pressed() 的结果一样按键值索引
+class KeyState:
+    def __init__(self, keys = ()):
+        self.keys = frozenset(keys)
+
+    def __getitem__(self, key):
+        return key in self.keys
+
+    @classmethod
+    def from_mask(cls, mask):
+        return cls(key for bit, key in enumerate(GAME_KEYS) if mask >> bit & 1)
+
+# 键盘输入来源：默认读取真实键盘，脚本（如基准测试）可以换成固定的按键
+class Controls:
+    def __init__(self):
+        self.scripted = None
+
+    def get_pressed(self):
+        if self.scripted is None:
+            return pygame.key.get_pressed()
+        return self.scripted
+
+    # 之后的每一帧都按住这些按键（空列表表示全部松开）
+    def hold(self, keys):
+        self.scripted = KeyState(keys)
+
+    # 恢复读取真实键盘
+    def use_keyboard(self):
+        self.scripted = None
+
+controls = Controls()
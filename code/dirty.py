@@ -0,0 +1,35 @@
+import pygame
+from settings import *
+
+# 脏矩形：记录本帧画面上改变的区域，display.update只提交这些区域；
+# 相机移动、整屏颜色改变等情况下提交整个画面
+# SCALED（垂直同步）模式下 display.update 总是提交整个渲染纹理，部分提交没有好处，
+# 此时 enabled 为 False：不记录脏矩形，每帧提交整个画面（只有 --no-vsync 的普通窗口受益）
+class DirtyRects:
+    def __init__(self):
+        self.rects = []
+        self.full = True
+        self.enabled = True
+
+    def add(self, rect):
+        if not self.full:
+            self.rects.append(pygame.Rect(rect))
+
+    def add_all(self, rects):
+        if not self.full:
+            self.rects.extend(rects)
+
+    # 下次提交整个画面
+    def invalidate(self):
+        self.full = True
+        self.rects.clear()
+
+    def present(self):
+        if self.full or len(self.rects) > DIRTY_RECT_LIMIT:
+            pygame.display.update()
+        elif self.rects:
+            pygame.display.update(self.rects)
+        self.rects.clear()
+        self.full = not self.enabled
+
+dirty_rects = DirtyRects()
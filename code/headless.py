@@ -0,0 +1,54 @@
+import os, time
+import pygame
+from settings import *
+from level import Level
+from profiler import profiler
+from loading import load_startup_assets
+import rng
+
+# 无窗口模式：SDL使用dummy视频/音频驱动，必须在pygame.init之前设置
+def use_dummy_drivers():
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+# 无窗口加速模拟：用固定的dt逐帧推进Level，尽可能快地运行
+# 给出replay时按录像中每帧的dt和按键推进
+class Simulation:
+    def __init__(self, dt = 1 / TICK_RATE, render_every = 0, seed = None, replay = None):
+        use_dummy_drivers()
+        pygame.init()
+        pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+
+        if replay:
+            seed = replay.seed
+        if seed is not None:
+            rng.seed(seed)
+        load_startup_assets()
+        self.level = Level()
+        self.dt = dt # 每帧的模拟时间（秒）
+        self.render_every = render_every # 每N帧描绘一次，0为不描绘
+        self.replay = replay
+        self.frame = 0
+
+    # 推进一帧
+    def step(self):
+        render = self.render_every > 0 and self.frame % self.render_every == 0
+        dt = self.replay.next_frame() if self.replay else self.dt
+        profiler.begin_frame()
+        self.level.run(dt, render)
+        profiler.end_frame()
+        self.frame += 1
+
+    # 进入新的一天（与睡觉后的过渡相同）
+    def advance_day(self):
+        self.level.reset()
+
+    # 运行frames帧，day_length>0时每day_length帧进入新的一天；返回实际耗时（秒）
+    def run(self, frames, day_length = 0):
+        start = time.perf_counter()
+        for _ in range(frames):
+            pygame.event.pump()
+            self.step()
+            if day_length and self.frame % day_length == 0:
+                self.advance_day()
+        return time.perf_counter() - start
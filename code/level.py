@@ -1,27 +1,39 @@
-import pygame 
+import os, pygame 
 from settings import *
 from player import Player
 from overlay import Overlay
-from sprites import Generic, Water, WildFlower, Tree, Interaction, Particale
-from pytmx.util_pygame import load_pygame # 加载基于 Tiled 编辑器创建的 .tmx 地图文件的模块
+from sprites import Tree, Interaction, spawn_particle
+from tilemap import load_map # 加载编译缓存后的 .tmx 地图
 from support import *
 from transition import Transition
+from postprocess import PostProcess, WHITE
+from chunks import TileChunks
+from streaming import World
+from collision import StaticCollision, compile_collision
+from spatial import SpatialGroup, IndexedGroup
 from soil import SoilLayer
 from sky import Rain, Sky
-from random import randint
+from rng import randint
 from memu import Menu
+from timer import game_clock, world_timers, ui_timers
+from profiler import profiler
+from dirty import dirty_rects
+from save import Saver
+from bisect import bisect_left, bisect_right
+from heapq import merge
 
 class Level:
-	def __init__(self):
+	# save_file: 存档文件，存在时读取，每天开始时自动保存；None为不读写存档（无窗口模式、基准测试、录像）
+	def __init__(self, save_file = None):
 
 		# get the display surface
 		self.display_surface = pygame.display.get_surface()
 
 		# sprite groups
 		self.all_sprites = CameraGroup() # 摄像组
-		self.collision_sprites = pygame.sprite.Group() # 可碰撞sprite组
-		self.tree_sprites = pygame.sprite.Group() # 树组
-		self.interaction_sprites = pygame.sprite.Group() # 交互组
+		self.collision_sprites = SpatialGroup('hitbox') # 可碰撞sprite组（按碰撞箱建空间索引）
+		self.tree_sprites = SpatialGroup() # 树组
+		self.interaction_sprites = SpatialGroup() # 交互组
 
 		self.soil_layer = SoilLayer(self.all_sprites,self.collision_sprites) # 土壤层
 		self.setup() # 创建实例
@@ -29,45 +41,46 @@ class Level:
 		self.transition = Transition(self.reset, self.player) # 过渡
 
 		# sky
-		self.rain = Rain(self.all_sprites)
+		self.rain = Rain(self.all_sprites, self.world.bounds)
 		self.raining = randint(0,10) > 7 # 是否下雨
 		self.soil_layer.raining = self.raining
 		self.sky = Sky()
+		self.last_dt = 0 # 最近一次模拟的步长
+		self.post_process = PostProcess()
 
 		# shop
 		self.menu = Menu(self.player, self.toggle_shop)
 		self.shop_active = False
 
 		# music
-		self.success = pygame.mixer.Sound('../audio/success.wav')
+		self.success = import_sound('../audio/success.wav')
 		self.success.set_volume(0.2)
 
-		self.music = pygame.mixer.Sound('../audio/music.mp3')
-		self.music.set_volume(0.1)
-		self.music.play(loops = -1)
+		play_music('../audio/music.mp3', 0.1) # 流式播放
+
+		# save
+		self.saver = Saver(save_file) if save_file else None
+		if self.saver and os.path.exists(save_file):
+			try:
+				self.saver.load(self)
+			except (OSError, ValueError) as error:
+				print(f'could not load {save_file}: {error}')
+
+		self.world.update(self.player.rect.center) # 加载玩家附近的块
 
 	# 创建实例
 	def setup(self):
-		# 加载 .tmx 地图文件
-		tmx_data = load_pygame('../data/map.tmx')
-
-		# house: 加载 house bottom 和 house top 中的图块
-		for layer in ['HouseFloor', 'HouseFurnitureBottom']:
-			for x, y, surf in tmx_data.get_layer_by_name(layer).tiles():
-				Generic((x * TILE_SIZE, y * TILE_SIZE), surf, self.all_sprites, LAYERS['house bottom'])
-		for layer in ['HouseWalls', 'HouseFurnitureTop']:
-			for x, y, surf in tmx_data.get_layer_by_name(layer).tiles():
-				Generic((x * TILE_SIZE, y * TILE_SIZE), surf, self.all_sprites)
-
-		# Fence 栅栏
-		for x, y, surf in tmx_data.get_layer_by_name('Fence').tiles():
-			Generic((x * TILE_SIZE, y * TILE_SIZE), surf, [self.all_sprites, self.collision_sprites])
-
-		# water
-		water_frames = import_folder('../graphics/water')
-		for x, y, surf in tmx_data.get_layer_by_name('Water').tiles():
-			Water((x * TILE_SIZE, y * TILE_SIZE), water_frames, self.all_sprites)
-		
+		# 加载 .tmx 地图文件（读取编译缓存）
+		tmx_data = load_map('../data/map.tmx')
+
+		# house: 静态图层按块烘焙，随世界块加载（见下方 World）
+		self.house_bottom = TileChunks(self.all_sprites, LAYERS['house bottom'], ['HouseFloor', 'HouseFurnitureBottom'])
+		# 墙、家具顶部与栅栏要和玩家按y轴遮挡，按行烘焙（每行的centery与原图块相同）
+		self.house_top = TileChunks(self.all_sprites, LAYERS['main'], ['HouseWalls', 'HouseFurnitureTop', 'Fence'], (CHUNK_SIZE, TILE_SIZE))
+
+		# 栅栏和碰撞图层：编译成合并后的静态碰撞箱
+		self.static_collision = StaticCollision(compile_collision(tmx_data, ['Collision', 'Fence']))
+
 		# trees
 		for obj in tmx_data.get_layer_by_name('Trees'):
 			Tree(
@@ -78,15 +91,6 @@ class Level:
 				name = obj.name,
 				player_add = self.player_add)
 
-		# wildflowers
-		for obj in tmx_data.get_layer_by_name('Decoration'):
-			WildFlower((obj.x, obj.y), obj.image, [self.all_sprites, self.collision_sprites])
-
-		# collion tiles
-		for x, y, surf in tmx_data.get_layer_by_name('Collision').tiles():
-			# Generic((x * TILE_SIZE, y * TILE_SIZE), pygame.Surface((TILE_SIZE,TILE_SIZE)), self.collision_sprites)
-			Generic((x * TILE_SIZE, y * TILE_SIZE), surf, self.collision_sprites)
-
 		# Player
 		for obj in tmx_data.get_layer_by_name('Player'):
 			if obj.name == 'Start': # 初始化玩家位置
@@ -94,6 +98,7 @@ class Level:
 					pos = (obj.x, obj.y),
 					group = self.all_sprites,
 					collision_sprites = self.collision_sprites,
+					static_collision = self.static_collision,
 					tree_sprites = self.tree_sprites,
 					interaction = self.interaction_sprites,
 					soil_layer = self.soil_layer,
@@ -104,13 +109,8 @@ class Level:
 			if obj.name == 'Trader':
 				Interaction((obj.x, obj.y), (obj.width,obj.height), self.interaction_sprites, obj.name)
 
-		# 导入地板
-		Generic(
-			pos = (0,0),
-			surf = pygame.image.load('../graphics/world/ground.png').convert_alpha(),
-			groups = self.all_sprites,
-			z = LAYERS['ground']
-		)
+		# 地面、水面、装饰花和房屋图层按与玩家的距离分块加载
+		self.world = World(tmx_data, self.all_sprites, self.collision_sprites, [self.house_bottom, self.house_top])
 
 	# 获得物品
 	def player_add(self, item):
@@ -121,96 +121,244 @@ class Level:
 	# 打开商店
 	def toggle_shop(self):
 		self.shop_active = not self.shop_active
+		world_timers.paused = self.shop_active # 商店打开时游戏世界暂停
+		dirty_rects.invalidate()
 
 	# 重置新的一天
 	def reset(self):
-
-		# plants
-		self.soil_layer.update_plants()
-
-		# soil
-		self.soil_layer.remove_water()
-		# randomize the rain
-		self.raining = randint(0,10) > 7
-		self.soil_layer.raining = self.raining
-		if self.raining:
-			self.soil_layer.water_all()
-
-		# apple on the trees
-		for tree in self.tree_sprites.sprites():
-			for apple in tree.apple_sprites.sprites(): # 清除现有的苹果
-				apple.kill()
-			tree.create_fruit() # 创建新的苹果
-
-		# sky
-		self.sky.start_color = [255,255,255]
+		with profiler.scope('new day'):
+			# plants
+			self.soil_layer.update_plants()
+
+			# soil
+			self.soil_layer.remove_water()
+			# randomize the rain
+			self.raining = randint(0,10) > 7
+			self.soil_layer.raining = self.raining
+			if self.raining:
+				self.soil_layer.water_all()
+
+			# apple on the trees
+			for tree in self.tree_sprites.sprites():
+				for apple in tree.apple_sprites.sprites(): # 清除现有的苹果
+					apple.kill()
+				tree.create_fruit() # 创建新的苹果
+
+			# sky
+			self.sky.start_color = [255,255,255]
+
+			# 自动存档（写入在后台线程进行）
+			if self.saver:
+				self.saver.save(self)
 
 	# 收获
 	def plant_collision(self):
 		if self.soil_layer.plant_sprites:
-			for plant in self.soil_layer.plant_sprites.sprites():
-				if plant.harvestable and plant.rect.colliderect(self.player.hitbox):
+			for plant in self.soil_layer.plant_sprites.query(self.player.hitbox): # 只检测玩家附近的植物
+				if self.soil_layer.is_harvestable(plant) and plant.rect.colliderect(self.player.hitbox):
 					self.player_add(plant.plant_type) # 获得植物
-					plant.kill() # 删除植物
 					# 粒子效果
-					Particale(plant.rect.topleft, plant.image, self.all_sprites, z = LAYERS['main'])
-					self.soil_layer.grid[plant.rect.centery // TILE_SIZE][plant.rect.centerx // TILE_SIZE].remove('P')
-
-	# 运行
-	def run(self,dt):
+					spawn_particle(plant.rect.topleft, plant.image, self.all_sprites, z = LAYERS['main'])
+					self.soil_layer.remove_plant(plant) # 删除植物
+
+	# 模拟一步（固定步长dt）
+	def update(self, dt):
+		game_clock.advance(dt) # 推进游戏时钟
+		ui_timers.advance(dt) # 处理到期的定时器
+		world_timers.advance(dt)
+		self.last_dt = dt
+		self.player.previous_pos.update(self.player.pos) # 插值的起点
+		self.all_sprites.follow(self.player) # 相机跟随（雨按视口生成）
 
-		# drawing logic
-		self.display_surface.fill('black')
-		self.all_sprites.custom_draw(self.player) # 自定义描绘组内sprites
-		
 		# updates
-		if self.shop_active: # 显示商店
-			self.menu.update() 
+		if self.shop_active: # 商店
+			with profiler.scope('menu'):
+				self.menu.update()
 		else:
-			self.all_sprites.update(dt) # 更新组内所有sprites
-			self.plant_collision()
-		
-		# 叠加层显示
-		self.overlay.display()
+			with profiler.scope('sprites update'):
+				self.all_sprites.update(dt) # 更新组内所有sprites
+			with profiler.scope('plant collision'):
+				self.plant_collision()
+
+		# 按玩家位置加载、卸载世界块
+		with profiler.scope('streaming'):
+			self.world.update(self.player.rect.center)
 
 		# rain
-		if self.raining and not self.shop_active:
-			self.rain.update()
+		if not self.shop_active:
+			with profiler.scope('rain'):
+				self.rain.update(dt, self.raining)
 
 		# daytime
-		self.sky.display(dt,self.shop_active)
+		with profiler.scope('sky'):
+			self.sky.update(dt, self.shop_active)
 
-		# transition overlay
+		# transition
 		if self.player.sleep: # 睡觉
-			self.transition.play() # 播放过渡
+			with profiler.scope('transition'):
+				self.transition.update(dt) # 播放过渡
+
+	# 描绘：alpha为距上一次模拟的进度（0~1），移动的物体在上一步与当前位置之间插值
+	def draw(self, alpha = 1):
+		with profiler.scope('draw world'):
+			self.display_surface.fill('black')
+			self.rain.lag = (1 - alpha) * self.last_dt
+			self.all_sprites.custom_draw(self.player, alpha) # 自定义描绘组内sprites
+
+		if self.shop_active: # 显示商店
+			with profiler.scope('menu'):
+				self.menu.display()
+
+		# 叠加层显示
+		with profiler.scope('overlay'):
+			self.overlay.display()
+
+		# 天色与睡觉过渡合成一次全屏相乘
+		with profiler.scope('post process'):
+			self.post_process.apply(self.sky.tint(), self.transition.tint() if self.player.sleep else WHITE)
+
+	# 模拟一步后立即描绘；render为False时只模拟不描绘（无窗口模式）
+	def run(self, dt, render = True):
+		self.update(dt)
+		if render:
+			self.draw()
+
+# 渲染层：静态sprite按y轴排序一次，移动sprite每帧单独排序
+class RenderLayer:
+	def __init__(self):
+		self.keys = [] # 静态sprite的centery（有序）
+		self.static = [] # 与keys一一对应
+		self.moving = [] # 移动的sprite（玩家、雨滴等）
+		self.sprite_keys = {} # sprite -> 加入时的centery，移动sprite为None
+		self.max_height = 0
+
+	def add(self, sprite):
+		if getattr(sprite, 'moving', False):
+			self.moving.append(sprite)
+			self.sprite_keys[sprite] = None
+		else:
+			key = sprite.rect.centery
+			index = bisect_right(self.keys, key)
+			self.keys.insert(index, key)
+			self.static.insert(index, sprite)
+			self.sprite_keys[sprite] = key
+			self.max_height = max(self.max_height, sprite.rect.height)
+
+	def remove(self, sprite):
+		key = self.sprite_keys.pop(sprite)
+		if key is None:
+			self.moving.remove(sprite)
+		else:
+			index = bisect_left(self.keys, key)
+			while self.static[index] is not sprite:
+				index += 1
+			del self.keys[index]
+			del self.static[index]
+
+	# 视口内的sprite，按y轴排序
+	def visible(self, view):
+		# 只检查centery落在视口（加上最大半高）范围内的静态sprite
+		margin = self.max_height // 2 + 1
+		start = bisect_left(self.keys, view.top - margin)
+		end = bisect_right(self.keys, view.bottom + margin)
+		static = [sprite for sprite in self.static[start:end] if view.colliderect(sprite.rect)]
+		if not self.moving:
+			return static
+
+		moving = sorted(
+			(sprite for sprite in self.moving if view.colliderect(sprite.rect)),
+			key = lambda sprite: sprite.rect.centery)
+		return merge(static, moving, key = lambda sprite: sprite.rect.centery)
 
 # 相机组
-class CameraGroup(pygame.sprite.Group):
+class CameraGroup(IndexedGroup):
 	def __init__(self):
 		super().__init__() # 父类__init__初始化
 		self.display_surface = pygame.display.get_surface()
 		# 相机偏移量
 		self.offset = pygame.math.Vector2()
-
-	# 自定义绘图
-	def custom_draw(self, player):
+		self.view = pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT) # 相机视口（世界坐标）
+
+		# 渲染队列：每一层一个桶
+		self.layers = {z: RenderLayer() for z in sorted(LAYERS.values())}
+		self.batches = {z: [] for z in self.layers} # 每层的批量描绘函数（如雨粒子）
+		self.sprite_layer = {} # sprite -> 所在层
+		# 新加入的sprite在描绘前才分层（加入组时z与rect可能还未设置）
+		self.pending = {}
+
+		# 上一帧描绘的内容，用于计算脏矩形
+		self.drawn = {}
+		self.drawn_view = None
+
+	def add_internal(self, sprite, layer = None):
+		super().add_internal(sprite, layer)
+		self.pending[sprite] = None
+
+	def remove_internal(self, sprite):
+		super().remove_internal(sprite)
+		if sprite in self.pending:
+			del self.pending[sprite]
+		else:
+			self.layers[self.sprite_layer.pop(sprite)].remove(sprite)
+
+	# 注册批量描绘函数：draw(surface, view) 在该层的sprite之后调用
+	def add_batch(self, z, draw):
+		self.batches[z].append(draw)
+
+	# sprite的z或rect改变后调用，重新加入渲染队列
+	def refresh(self, sprite):
+		if sprite in self.sprite_layer:
+			self.layers[self.sprite_layer.pop(sprite)].remove(sprite)
+			self.pending[sprite] = None
+
+	def flush_pending(self):
+		for sprite in self.pending:
+			self.layers[sprite.z].add(sprite)
+			self.sprite_layer[sprite] = sprite.z
+		self.pending.clear()
+
+	# 相机跟随玩家
+	def follow(self, player):
 		# 偏移量设置：确保玩家在屏幕中心
 		self.offset.x = player.rect.centerx - SCREEN_WIDTH / 2
 		self.offset.y = player.rect.centery - SCREEN_HEIGHT / 2
-
-		# 遍历每一层，分层顺序描绘
-		for layer in LAYERS.values():
-			for sprite in sorted(self.sprites(), key = lambda sprite: sprite.rect.centery): # 按y轴排序
-				if sprite.z == layer:
-					offset_rect = sprite.rect.copy()
-					offset_rect.center -= self.offset
-					self.display_surface.blit(sprite.image, offset_rect)
-
-					# # anaytics 
-					# if sprite == player:
-					# 	pygame.draw.rect(self.display_surface,'red',offset_rect,5)
-					# 	hitbox_rect = player.hitbox.copy()
-					# 	hitbox_rect.center = offset_rect.center
-					# 	pygame.draw.rect(self.display_surface,'green',hitbox_rect,5)
-					# 	target_pos = offset_rect.center + PLAYER_TOOL_OFFSET[player.status.split('_')[0]]
-					# 	pygame.draw.circle(self.display_surface,'blue',target_pos,5)
\ No newline at end of file
+		self.view.topleft = (round(self.offset.x), round(self.offset.y))
+
+	# 自定义绘图：玩家（和相机）描绘在插值位置
+	def custom_draw(self, player, alpha = 1):
+		shift = player.render_offset(alpha)
+		player.rect.move_ip(shift) # 只在描绘期间移到插值位置，描绘后恢复
+		self.follow(player)
+		self.flush_pending()
+
+		# 分层顺序描绘，只描绘视口内的sprite
+		offset_x, offset_y = self.view.topleft
+		drawn = {} # sprite -> (image, 屏幕位置)
+		for z, render_layer in self.layers.items():
+			visible = list(render_layer.visible(self.view))
+			blit_list = [(sprite.image, (sprite.rect.x - offset_x, sprite.rect.y - offset_y)) for sprite in visible]
+			self.display_surface.blits(blit_list, doreturn = False)
+			if dirty_rects.enabled:
+				drawn.update(zip(visible, blit_list))
+			for draw in self.batches[z]:
+				draw(self.display_surface, self.view)
+		player.rect.move_ip(-shift[0], -shift[1])
+		if dirty_rects.enabled:
+			self.mark_dirty(drawn)
+
+	# 脏矩形：相机移动时整屏更新，否则只更新图片或位置改变了的sprite（新旧两处）
+	def mark_dirty(self, drawn):
+		if self.view.topleft != self.drawn_view:
+			dirty_rects.invalidate()
+			self.drawn_view = self.view.topleft
+		else:
+			previous = self.drawn
+			for sprite, blit in drawn.items():
+				old_blit = previous.pop(sprite, None)
+				if old_blit != blit:
+					dirty_rects.add(blit[0].get_rect(topleft = blit[1]))
+					if old_blit:
+						dirty_rects.add(old_blit[0].get_rect(topleft = old_blit[1]))
+			for image, pos in previous.values(): # 不再描绘的sprite
+				dirty_rects.add(image.get_rect(topleft = pos))
+		self.drawn = drawn
@@ -0,0 +1,54 @@
+import time
+import pygame
+from settings import *
+from support import image_files, preload_images, load_atlas
+from tilemap import load_map
+from streaming import ground_chunk_files
+
+# 启动时需要的图片：关卡用到的地图图层和其余图形（作物、雨的图片等到用到时才加载，地面图按块加载）
+MAP_LAYERS = ['HouseFloor', 'HouseFurnitureBottom', 'HouseWalls', 'HouseFurnitureTop', 'Fence', 'Water', 'Collision', 'Trees', 'Decoration']
+STARTUP_FOLDERS = [
+    '../graphics/character', '../graphics/water', '../graphics/soil',
+    '../graphics/soil_water', '../graphics/stumps', '../graphics/overlay']
+STARTUP_FILES = ['../graphics/fruit/apple.png']
+
+def startup_images():
+    paths = load_map('../data/map.tmx').image_files(MAP_LAYERS) + STARTUP_FILES
+    for folder in STARTUP_FOLDERS:
+        paths += image_files(folder)
+    return paths
+
+# 启动资源：先加载图集页（小图都在其中），再解码图集以外的图片
+def load_startup_assets(progress = None):
+    load_atlas(ATLAS_INDEX, progress)
+    ground_chunk_files(GROUND_IMAGE, GROUND_CHUNK_DIR, CHUNK_SIZE) # 地面图改变后重新切块
+    preload_images(startup_images(), progress)
+
+# 加载画面：图片在线程池中解码，每完成一张更新进度条
+class LoadingScreen:
+    def __init__(self):
+        self.display_surface = pygame.display.get_surface()
+        self.font = pygame.font.Font(None, 36)
+        self.bar = pygame.Rect(0, 0, SCREEN_WIDTH // 2, 24)
+        self.bar.center = (SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2)
+        self.last_draw = 0
+
+    def progress(self, done, total):
+        pygame.event.pump() # 保持窗口响应
+        now = time.perf_counter()
+        if done < total and now - self.last_draw < 1 / 60:
+            return
+        self.last_draw = now
+
+        self.display_surface.fill('black')
+        text_surf = self.font.render(f'Loading {done}/{total}', True, 'White')
+        self.display_surface.blit(text_surf, text_surf.get_rect(midbottom = (self.bar.centerx, self.bar.top - 10)))
+        pygame.draw.rect(self.display_surface, 'White', self.bar, 2)
+        fill = self.bar.inflate(-8, -8)
+        fill.width = fill.width * done // total
+        pygame.draw.rect(self.display_surface, 'White', fill)
+        pygame.display.update()
+
+    def run(self):
+        self.progress(0, 1)
+        load_startup_assets(self.progress)
@@ -1,14 +1,47 @@
-import pygame, sys
+import pygame, sys, time, random, argparse
 from settings import *
 from level import Level
+from headless import Simulation
+from profiler import profiler
+from replay import Recorder, Replay
+from dirty import dirty_rects
+from loading import LoadingScreen
+from support import preload_sounds, asset_report
+import rng
 
 class Game:
-	def __init__(self):
+	def __init__(self, seed = None, record = None, replay = None, tick_rate = TICK_RATE, fps = FPS_LIMIT, vsync = VSYNC, save_file = None):
+		self.start_time = time.perf_counter()
+		self.first_frame_time = None # 启动到第一帧显示的时间（秒）
 		pygame.init() # 初始化pygame
-		self.screen = pygame.display.set_mode((SCREEN_WIDTH,SCREEN_HEIGHT))
+		self.screen = None
+		if vsync: # 垂直同步需要SCALED模式，不支持时使用普通窗口
+			try:
+				self.screen = pygame.display.set_mode((SCREEN_WIDTH,SCREEN_HEIGHT), pygame.SCALED, vsync = 1)
+				dirty_rects.enabled = False # SCALED模式下部分提交与整屏提交一样慢
+			except pygame.error:
+				pass
+		if self.screen is None:
+			self.screen = pygame.display.set_mode((SCREEN_WIDTH,SCREEN_HEIGHT))
 		pygame.display.set_caption('Silk Song') # 设置游戏窗口标题
 		self.clock = pygame.time.Clock() # 创建时钟对象
-		self.level = Level()
+		self.fps = fps # 描绘帧率上限，0为不限制
+		self.tick = 1 / tick_rate # 固定的模拟步长（秒）
+		self.accumulator = 0.0 # 尚未模拟的时间
+
+		# 录制/回放：所有随机数来自同一个种子，回放时使用录像中的种子
+		self.replay = replay
+		if replay:
+			seed = replay.seed
+		elif record and seed is None:
+			seed = random.SystemRandom().getrandbits(63)
+		if seed is not None:
+			rng.seed(seed)
+		self.recorder = Recorder(record, seed) if record else None
+
+		LoadingScreen().run() # 在线程池中解码图片，显示进度
+		self.level = Level(None if record or replay else save_file) # 录制、回放从新游戏开始，不读写存档
+		self.trace_file = None # 退出时导出帧分析
 
 	# 游戏主循环
 	def run(self):
@@ -16,13 +49,112 @@ class Game:
 			for event in pygame.event.get():
 				# 检测游戏退出
 				if event.type == pygame.QUIT:
-					pygame.quit()
-					sys.exit()
+					self.quit()
+				# F3 帧分析图表，F4 导出 Chrome trace
+				if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+					profiler.toggle()
+				if event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+					profiler.export_chrome_trace(PROFILER_TRACE_FILE)
+				# 窗口被遮挡后重新显示，需要整屏更新
+				if event.type == pygame.WINDOWEXPOSED:
+					dirty_rects.invalidate()
   
-			dt = self.clock.tick(120) / 1000 # 控制帧率
-			self.level.run(dt) # 关卡运行
-			pygame.display.update()
+			# 固定步长：按经过的时间模拟若干步，再在最后两步之间插值描绘
+			self.accumulator += min(self.clock.tick(self.fps) / 1000, MAX_FRAME_TIME)
+			profiler.begin_frame()
+			while self.accumulator >= self.tick:
+				self.accumulator -= self.step()
+			self.level.draw(self.accumulator / self.tick) # 关卡描绘
+			profiler.draw(self.screen)
+			with profiler.scope('present'):
+				dirty_rects.present() # 只更新改变的区域
+			profiler.end_frame()
+			if self.first_frame_time is None:
+				self.first_frame()
+
+	# 第一帧显示后：记录启动时间，在后台解码音效
+	def first_frame(self):
+		self.first_frame_time = time.perf_counter() - self.start_time
+		if profiler.enabled:
+			print(f'time to first frame: {self.first_frame_time * 1000:.0f} ms')
+		preload_sounds()
+
+	# 模拟一步，返回这一步的时长（回放时为录像中的dt）
+	def step(self):
+		dt = self.tick
+		if self.replay:
+			dt = self.replay.next_frame()
+			if dt is None:
+				self.quit()
+		elif self.recorder:
+			self.recorder.frame(dt)
+		self.level.update(dt)
+		return dt
+
+	def quit(self):
+		if self.level.saver:
+			self.level.saver.wait() # 等待后台存档写完
+		if self.recorder:
+			self.recorder.save(self.level)
+		if self.replay and self.replay.finished:
+			report_replay(self.replay, self.level)
+		if self.trace_file:
+			profiler.export_chrome_trace(self.trace_file)
+			print_asset_report()
+		pygame.quit()
+		sys.exit()
+
+def report_replay(replay, level):
+	result = 'matches' if replay.verify(level) else 'DOES NOT match'
+	print(f'replay of {len(replay)} frames: final state {result} the recording')
+
+# 每类资源占用的内存，与帧分析一起输出
+def print_asset_report():
+	report = asset_report()
+	print(f'assets: {sum(report.values()) / 1024 / 1024:.1f} MB')
+	for category, size in report.items():
+		print(f'  {category:<24}{size / 1024:>10.0f} KB')
+
+# 无窗口加速模拟，用于长时间测试和分析模拟开销
+def run_headless(args):
+	replay = Replay(args.replay) if args.replay else None
+	simulation = Simulation(dt = args.dt, render_every = args.render_every, seed = args.seed, replay = replay)
+	frames = len(replay) if replay else args.frames
+	elapsed = simulation.run(frames, args.day_length)
+	if args.trace:
+		profiler.export_chrome_trace(args.trace)
+		print_asset_report()
+	simulated = sum(replay.dts) if replay else frames * args.dt
+	print(f'{frames} frames, {simulated:.1f}s simulated in {elapsed:.2f}s '
+		f'({simulated / elapsed:.1f}x, {elapsed / frames * 1000:.3f} ms/frame)')
+	if replay:
+		report_replay(replay, simulation.level)
 
 if __name__ == '__main__':
-	game = Game()
-	game.run()
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--headless', action = 'store_true', help = 'run without a window as fast as possible')
+	parser.add_argument('--frames', type = int, default = 3600, help = 'headless: number of frames to simulate')
+	parser.add_argument('--dt', type = float, default = 1 / TICK_RATE, help = 'headless: simulated seconds per frame')
+	parser.add_argument('--render-every', type = int, default = 0, help = 'headless: render every Nth frame (0 = never)')
+	parser.add_argument('--day-length', type = int, default = 0, help = 'headless: start a new day every N frames (0 = never)')
+	parser.add_argument('--trace', help = 'record frame timings and write a Chrome trace-event JSON file on exit')
+	parser.add_argument('--tick-rate', type = int, default = TICK_RATE, help = 'simulation steps per second')
+	parser.add_argument('--fps', type = int, default = FPS_LIMIT, help = 'render frame rate limit (0 = uncapped)')
+	parser.add_argument('--no-vsync', action = 'store_true', help = 'do not sync rendering to the display (plain window, only changed regions are presented)')
+	parser.add_argument('--seed', type = int, help = 'seed for all game randomness')
+	parser.add_argument('--record', metavar = 'FILE', help = 'record keyboard input to FILE for deterministic replay')
+	parser.add_argument('--replay', metavar = 'FILE', help = 'replay a recording (with --headless: as fast as possible)')
+	parser.add_argument('--save', metavar = 'FILE', default = SAVE_FILE, help = 'save file, loaded at start and written every new day')
+	parser.add_argument('--no-save', action = 'store_true', help = 'start a new game and do not save')
+	args = parser.parse_args()
+	if args.record and (args.replay or args.headless):
+		parser.error('--record needs the window and cannot be combined with --replay or --headless')
+	profiler.enabled = bool(args.trace)
+
+	if args.headless:
+		run_headless(args)
+	else:
+		game = Game(args.seed, args.record, Replay(args.replay) if args.replay else None, args.tick_rate, args.fps, not args.no_vsync,
+			None if args.no_save else args.save)
+		game.trace_file = args.trace
+		game.run()
@@ -1,6 +1,8 @@
 import pygame
 from settings import *
-from timer import Timer
+from timer import Timer, ui_timers
+from controls import controls
+from dirty import dirty_rects
 
 class Menu:
     def __init__(self, player, toggle_menu):
@@ -9,7 +11,7 @@ class Menu:
         self.player = player
         self.toggle_menu = toggle_menu
         self.display_surface = pygame.display.get_surface()
-        self.font = pygame.font.Font('../font/LycheeSoda.ttf', 30) # 设置字体
+        self.font = None # 字体和条目文字在第一次打开商店时才加载
 
         # options
         self.width = 400
@@ -19,23 +21,42 @@ class Menu:
         # entries 条目
         self.options = list(self.player.item_inventory.keys()) + list(self.player.seed_inventory.keys())
         self.sell_border = len(self.player.item_inventory) - 1 # 分隔卖出和买入
-        self.setup()
 
         # movement 选中条目索引
         self.index = 0
-        self.timer = Timer(200)
-
-    # 显示金钱
-    def display_money(self):
+        self.timer = Timer(200, scheduler = ui_timers) # 商店打开时游戏世界的定时器暂停
+
+        # 商店画面缓存：库存、金钱或选中条目改变时才重绘
+        self.amount_surfs = {} # 条目索引 -> (数额, 文字surf)，只保留当前数额
+        self.money_rect = pygame.Rect(0, 0, 0, 0)
+        self.dirty = True
+        self.player.observers.append(self.mark_dirty)
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    # 数额改变时才重新渲染文字
+    def amount_surf(self, index, amount):
+        cached = self.amount_surfs.get(index)
+        if cached is None or cached[0] != amount:
+            cached = (amount, self.font.render(str(amount), False, 'Black'))
+            self.amount_surfs[index] = cached
+        return cached[1]
+
+    # 金钱
+    def render_money(self):
         text_surf = self.font.render(f'${self.player.money}', False, 'Black')
         text_rect = text_surf.get_rect(midbottom = (SCREEN_WIDTH / 2, SCREEN_HEIGHT - 20))
+        self.money_rect = text_rect.inflate(10,10)
+        self.money_surf = pygame.Surface(self.money_rect.size, pygame.SRCALPHA)
 
         # 金钱背景
-        pygame.draw.rect(self.display_surface, 'White', text_rect.inflate(10,10), 0, 4)
-        # 文字显示
-        self.display_surface.blit(text_surf, text_rect)
+        pygame.draw.rect(self.money_surf, 'White', self.money_surf.get_rect(), 0, 4)
+        # 文字
+        self.money_surf.blit(text_surf, text_surf.get_rect(center = self.money_surf.get_rect().center))
 
     def setup(self):
+        self.font = pygame.font.Font('../font/LycheeSoda.ttf', 30) # 设置字体
 
         # create the text surfaces 物品文字surf
         self.text_surfs = []
@@ -52,14 +73,15 @@ class Menu:
             self.menu_top,
             self.width,
             self.total_height)
+        self.menu_surf = pygame.Surface(self.main_rect.size, pygame.SRCALPHA)
         
         # buy / sell text surface
         self.buy_text = self.font.render('buy', False, 'Black')
         self.sell_text = self.font.render('sell', False, 'Black')
 
     def input(self):
-        keys = pygame.key.get_pressed()
-        self.timer.update()
+        keys = controls.get_pressed()
+        index = self.index
 
         if keys[pygame.K_ESCAPE]:
             self.toggle_menu() # 关闭商店
@@ -95,42 +117,59 @@ class Menu:
             self.index = len(self.options) - 1
         if self.index > len(self.options) - 1:
             self.index = 0
+        if self.index != index:
+            self.dirty = True
 
-    def show_entry(self, text_surf, amount, top, selected):
+    # 条目描绘在商店surface上（坐标相对main_rect）
+    def show_entry(self, index, text_surf, amount, top, selected):
 
         # background
         bg_rect = pygame.Rect(
-            self.main_rect.left, 
+            0, 
             top, 
             self.width, 
             text_surf.get_height() + (self.padding * 2))
-        pygame.draw.rect(self.display_surface, 'White', bg_rect, 0, 4)
+        pygame.draw.rect(self.menu_surf, 'White', bg_rect, 0, 4)
 
         # text
-        text_rect = text_surf.get_rect(midleft = (self.main_rect.left + 20, bg_rect.centery))
-        self.display_surface.blit(text_surf, text_rect)
+        text_rect = text_surf.get_rect(midleft = (20, bg_rect.centery))
+        self.menu_surf.blit(text_surf, text_rect)
         
         # amount 数额
-        amount_surf = self.font.render(str(amount), False, 'Black')
-        amount_rect = amount_surf.get_rect(midright = (self.main_rect.right - 20, bg_rect.centery))
-        self.display_surface.blit(amount_surf, amount_rect)
+        amount_surf = self.amount_surf(index, amount)
+        amount_rect = amount_surf.get_rect(midright = (self.width - 20, bg_rect.centery))
+        self.menu_surf.blit(amount_surf, amount_rect)
 
         # selected
         if selected:
-            pygame.draw.rect(self.display_surface, 'Black', bg_rect, 4, 4)
+            pygame.draw.rect(self.menu_surf, 'Black', bg_rect, 4, 4)
             if self.index <= self.sell_border: # 卖出
-                pos_rect = self.sell_text.get_rect(midleft = (self.main_rect.left + 150, bg_rect.centery))
-                self.display_surface.blit(self.sell_text, pos_rect)
+                pos_rect = self.sell_text.get_rect(midleft = (150, bg_rect.centery))
+                self.menu_surf.blit(self.sell_text, pos_rect)
             else: # 买入
-                pos_rect = self.buy_text.get_rect(midleft = (self.main_rect.left + 150, bg_rect.centery))
-                self.display_surface.blit(self.buy_text, pos_rect)
+                pos_rect = self.buy_text.get_rect(midleft = (150, bg_rect.centery))
+                self.menu_surf.blit(self.buy_text, pos_rect)
 
-    def update(self):
-        self.input()
-        self.display_money()
+    def render(self):
+        self.render_money()
+        self.menu_surf.fill((0, 0, 0, 0))
+        amount_list = list(self.player.item_inventory.values()) + list(self.player.seed_inventory.values())
         for text_index, text_surf in enumerate(self.text_surfs):
             # 每一项的顶部
-            top = self.main_rect.top + text_index * (text_surf.get_height() + (self.padding * 2) + self.space)
-            amount_list = list(self.player.item_inventory.values()) + list(self.player.seed_inventory.values())
-            amount = amount_list[text_index]
-            self.show_entry(text_surf, amount, top, self.index == text_index)
+            top = text_index * (text_surf.get_height() + (self.padding * 2) + self.space)
+            self.show_entry(text_index, text_surf, amount_list[text_index], top, self.index == text_index)
+        self.dirty = False
+
+    def update(self):
+        self.input()
+
+    def display(self):
+        if self.font is None:
+            self.setup()
+        if self.dirty:
+            dirty_rects.add(self.money_rect) # 金钱的宽度可能变小
+            self.render()
+            dirty_rects.add(self.money_rect)
+            dirty_rects.add(self.main_rect)
+        self.display_surface.blit(self.money_surf, self.money_rect)
+        self.display_surface.blit(self.menu_surf, self.main_rect)
@@ -1,5 +1,7 @@
 import pygame
 from settings import *
+from support import import_image
+from dirty import dirty_rects
 
 class Overlay:
     def __init__(self,player):
@@ -10,31 +12,50 @@ class Overlay:
 
         # imports
         overlay_path = '../graphics/overlay/'
-        self.tools_surf = {tool: pygame.image.load(f'{overlay_path}{tool}.png').convert_alpha() for tool in self.player.tools}
-        self.seeds_surf = {seed: pygame.image.load(f'{overlay_path}{seed}.png').convert_alpha() for seed in self.player.seeds}
+        self.tools_surf = {tool: import_image(f'{overlay_path}{tool}.png') for tool in self.player.tools}
+        self.seeds_surf = {seed: import_image(f'{overlay_path}{seed}.png') for seed in self.player.seeds}
 
+        # 选中时放大的图标，只生成一次
+        self.selected_surf = {name: pygame.transform.scale_by(surf, (1.05, 1.05))
+            for name, surf in list(self.tools_surf.items()) + list(self.seeds_surf.items())}
+
+        self.icon_rects = {name: surf.get_rect(center = OVERLAY_POSITIONS[name])
+            for name, surf in list(self.tools_surf.items()) + list(self.seeds_surf.items())}
+        # 图标所在的区域（含放大的图标和选中边框），选中的物品改变时整块标记为脏矩形
+        rects = []
+        for rect in self.icon_rects.values():
+            frame_rect = pygame.Rect(0, 0, 75, 75)
+            frame_rect.center = rect.center
+            rects.append(rect.inflate(8, 8).union(frame_rect))
+        self.rect = rects[0].unionall(rects[1:])
+        self.state = None # 上次描绘时的 (手持物, 工具, 种子)
+
+    # 图标直接描绘到画面上（比透明的缓存surface整块blit更快），只有放大的图标是缓存的
     def display(self):
+        state = (self.player.hand, self.player.selected_tool, self.player.selected_seed)
+        if state != self.state:
+            self.state = state
+            dirty_rects.add(self.rect)
 
         self_frame = pygame.Rect(0, 0, 75, 75) # 选中边框
         # tool
         for all_tools in self.player.tools:
             tool_surf = self.tools_surf[all_tools]
-            tool_rect = tool_surf.get_rect(center = OVERLAY_POSITIONS[all_tools])
+            tool_rect = self.icon_rects[all_tools]
             # 选中图标变化
             if all_tools == self.player.selected_tool and self.player.hand == 'tool':
-                tool_surf = pygame.transform.scale_by(tool_surf,(1.05, 1.05)) # 放大选中工具
+                tool_surf = self.selected_surf[all_tools] # 放大选中工具
                 self_frame.center = tool_rect.center
                 pygame.draw.rect(self.display_surface, (255, 0, 0), self_frame, 2) # 选中图标边框
             self.display_surface.blit(tool_surf,tool_rect)
-        
+
         # seeds
         for all_seeds in self.player.seeds:
             seed_surf = self.seeds_surf[all_seeds]
-            seed_rect = seed_surf.get_rect(center = OVERLAY_POSITIONS[all_seeds])
+            seed_rect = self.icon_rects[all_seeds]
             # 选中图标变化
             if all_seeds == self.player.selected_seed and self.player.hand == 'seed':
-                seed_surf = pygame.transform.scale_by(seed_surf,(1.05, 1.05)) # 放大选中种子
+                seed_surf = self.selected_surf[all_seeds] # 放大选中种子
                 self_frame.center = seed_rect.center
-                pygame.draw.rect(self.display_surface, (255, 0, 0), self_frame, 2) # 选中图标边框 
+                pygame.draw.rect(self.display_surface, (255, 0, 0), self_frame, 2) # 选中图标边框
             self.display_surface.blit(seed_surf,seed_rect)
-
@@ -0,0 +1,79 @@
+import os, json, glob, argparse
+import pygame
+from settings import *
+from support import asset_key, frame_key, ATLAS_VERSION
+
+# 离线图集打包：把小图按文件夹、帧序号的顺序排进若干张图集页，并生成索引
+# 用法: python pack_atlas.py（生成的图集不提交到仓库，图片改变后重新运行）
+
+# 文件夹（含子文件夹）中的图片，顺序固定：子文件夹按名称，图片按帧序号
+def source_images(folders):
+    for folder in folders:
+        for directory, subdirs, files in os.walk(asset_key(folder)):
+            subdirs.sort()
+            for name in sorted((name for name in files if name.endswith('.png')), key = frame_key):
+                yield os.path.join(directory, name)
+
+# 货架式装箱：按顺序放入当前行，放不下换行，页满换页；同一文件夹的帧在图集中相邻
+# 返回每张图的 (页, x, y)，比整页还大的图为 None（仍从文件加载）
+def pack(sizes, page_size):
+    placements = []
+    page = x = y = shelf_height = 0
+    for width, height in sizes:
+        if width > page_size or height > page_size:
+            placements.append(None)
+            continue
+        if x + width > page_size: # 换行
+            x, y, shelf_height = 0, y + shelf_height, 0
+        if y + height > page_size: # 换页
+            page, x, y, shelf_height = page + 1, 0, 0, 0
+        placements.append((page, x, y))
+        x += width
+        shelf_height = max(shelf_height, height)
+    return placements
+
+def build_atlas(index_path, folders, page_size):
+    atlas_dir = os.path.dirname(index_path)
+    os.makedirs(atlas_dir, exist_ok = True)
+    for old_page in glob.glob(os.path.join(atlas_dir, 'atlas_*.png')):
+        os.remove(old_page)
+
+    paths = list(source_images(folders))
+    images = [pygame.image.load(path) for path in paths]
+    placements = pack([image.get_size() for image in images], page_size)
+
+    # 每页只保留用到的范围
+    extents = {}
+    for image, placement in zip(images, placements):
+        if placement:
+            page, x, y = placement
+            width, height = extents.get(page, (0, 0))
+            extents[page] = (max(width, x + image.get_width()), max(height, y + image.get_height()))
+    pages = [pygame.Surface(extents[page], pygame.SRCALPHA) for page in range(len(extents))]
+
+    entries = {}
+    for path, image, placement in zip(paths, images, placements):
+        if placement:
+            page, x, y = placement
+            pages[page].blit(image, (x, y))
+            source_stat = os.stat(path)
+            source = os.path.relpath(path, atlas_dir).replace(os.sep, '/')
+            entries[source] = [page, x, y, image.get_width(), image.get_height(), source_stat.st_mtime_ns, source_stat.st_size]
+
+    page_names = []
+    for page, surface in enumerate(pages):
+        page_names.append(f'atlas_{page}.png')
+        pygame.image.save(surface, os.path.join(atlas_dir, page_names[-1]))
+    with open(index_path, 'w') as file:
+        json.dump({'version': ATLAS_VERSION, 'pages': page_names, 'images': entries}, file)
+
+    skipped = len(paths) - len(entries)
+    print(f'{len(entries)} images packed into {len(pages)} pages {[surface.get_size() for surface in pages]}' +
+        (f', {skipped} too large' if skipped else ''))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'pack small sprites into texture atlas pages')
+    parser.add_argument('--page-size', type = int, default = ATLAS_PAGE_SIZE)
+    parser.add_argument('--output', default = ATLAS_INDEX, help = 'index file; pages are written next to it')
+    args = parser.parse_args()
+    build_atlas(args.output, ATLAS_FOLDERS, args.page_size)
@@ -1,10 +1,26 @@
-import pygame
+import pygame, math
 from settings import *
 from support import *
 from timer import Timer
+from controls import controls
+from profiler import profiler
+
+# 库存：数量改变时通知观察者（界面只在有变化时重绘）
+class Inventory(dict):
+    def __init__(self, items, on_change):
+        super().__init__(items)
+        self.on_change = on_change
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.on_change()
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.on_change()
 
 class Player(pygame.sprite.Sprite): # Player继承Sprite的功能
-    def __init__(self, pos, group, collision_sprites, tree_sprites, interaction, soil_layer, toggle_shop):
+    def __init__(self, pos, group, collision_sprites, static_collision, tree_sprites, interaction, soil_layer, toggle_shop):
         # 调用父类__init__方法，初始化并将Player添加到指定的sprite组中
         super().__init__(group)
 
@@ -17,15 +33,18 @@ class Player(pygame.sprite.Sprite): # Player继承Sprite的功能
         self.image = self.animations[self.status][self.frame_index]
         self.rect = self.image.get_rect(center = pos)
         self.z = LAYERS['main']
+        self.moving = True # 每帧在渲染队列中重新排序
 
         # movement attributes
         self.direction = pygame.math.Vector2()
         self.pos = pygame.math.Vector2(self.rect.center)
+        self.previous_pos = self.pos.copy() # 上一次模拟后的位置，描绘时在两者之间插值
         self.speed = 400
 
         # collision
         self.hitbox = self.rect.copy().inflate((-126, -70))
         self.collision_sprites = collision_sprites
+        self.static_collision = static_collision # 编译后的碰撞图层（只有矩形）
 
         # timers
         self.timers = {
@@ -48,17 +67,18 @@ class Player(pygame.sprite.Sprite): # Player继承Sprite的功能
         self.hand = 'tool'
 
         # inventory 库存
-        self.item_inventory = {
+        self.observers = [] # 库存或金钱改变时调用
+        self.item_inventory = Inventory({
             'wood':   0,
             'apple':  0,
             'corn':   0,
             'tomato': 0
-        }
-        self.seed_inventory = {
+        }, self.notify)
+        self.seed_inventory = Inventory({
             'corn': 5,
             'tomato': 5
-        }
-        self.money = 200
+        }, self.notify)
+        self._money = 200
 
         # interaction
         self.tree_sprites = tree_sprites
@@ -68,16 +88,29 @@ class Player(pygame.sprite.Sprite): # Player继承Sprite的功能
         self.toggle_shop = toggle_shop
 
         # sound
-        self.watering = pygame.mixer.Sound('../audio/water.mp3')
+        self.watering = import_sound('../audio/water.mp3')
         self.watering.set_volume(0.2)
 
+    @property
+    def money(self):
+        return self._money
+
+    @money.setter
+    def money(self, value):
+        self._money = value
+        self.notify()
+
+    def notify(self):
+        for callback in self.observers:
+            callback()
+
     # 使用工具
     def use_tool(self):
         if self.selected_tool == 'hoe':
             self.soil_layer.get_hit(self.target_pos)
         
         if self.selected_tool == 'axe': # 斧子
-            for tree in self.tree_sprites.sprites():
+            for tree in self.tree_sprites.query_point(self.target_pos): # 只检测目标点所在格子的树
                 if tree.rect.collidepoint(self.target_pos): # 树在工具目标点处
                     tree.damage()
 
@@ -118,7 +151,7 @@ class Player(pygame.sprite.Sprite): # Player继承Sprite的功能
 
     # 按键输入
     def input(self):
-        keys = pygame.key.get_pressed()
+        keys = controls.get_pressed()
     
         if not self.timers['tool use'].active and not self.sleep: # 使用工具时不可移动
             # directions
@@ -165,7 +198,7 @@ class Player(pygame.sprite.Sprite): # Player继承Sprite的功能
             
             if keys[pygame.K_RETURN]:
                 # 检测是否产生碰撞，即玩家在交互区；并返回由碰撞的精灵组成的列表
-                collided_interaction_sprite = pygame.sprite.spritecollide(self,self.interaction,False)
+                collided_interaction_sprite = [sprite for sprite in self.interaction.query(self.rect) if sprite.rect.colliderect(self.rect)]
                 if collided_interaction_sprite:
                     if collided_interaction_sprite[0].name == 'Trader':
                         self.toggle_shop() # 打开/关闭商店
@@ -185,32 +218,28 @@ class Player(pygame.sprite.Sprite): # Player继承Sprite的功能
         if self.timers['tool use'].active:
             self.status = self.status.split('_')[0] + '_' + self.selected_tool
 
-    # 定时器更新
-    def update_timers(self):
-        for timer in self.timers.values():
-            timer.update()
-
     # 碰撞
     def collision(self, direction):
-        for sprite in self.collision_sprites.sprites():
-            if hasattr(sprite, 'hitbox'):
-                # 检测到碰撞（玩家与物体碰撞箱有重叠）
-                if sprite.hitbox.colliderect(self.hitbox):
-                    if direction == 'horizontal':
-                        if self.direction.x > 0: # moving right
-                            self.hitbox.right = sprite.hitbox.left
-                        if self.direction.x < 0: # moving left
-                            self.hitbox.left = sprite.hitbox.right
-                        self.rect.centerx = self.hitbox.centerx
-                        self.pos.x = self.hitbox.centerx
-
-                    if direction == 'vertical':
-                        if self.direction.y > 0: # moving down
-                            self.hitbox.bottom = sprite.hitbox.top
-                        if self.direction.y < 0: # moving up
-                            self.hitbox.top = sprite.hitbox.bottom
-                        self.rect.centery = self.hitbox.centery
-                        self.pos.y = self.hitbox.centery
+        # 只检测碰撞箱附近格子里的静态碰撞箱和sprite（树、花、植物）
+        hitboxes = self.static_collision.query(self.hitbox) + [sprite.hitbox for sprite in self.collision_sprites.query(self.hitbox)]
+        for hitbox in hitboxes:
+            # 检测到碰撞（玩家与物体碰撞箱有重叠）
+            if hitbox.colliderect(self.hitbox):
+                if direction == 'horizontal':
+                    if self.direction.x > 0: # moving right
+                        self.hitbox.right = hitbox.left
+                    if self.direction.x < 0: # moving left
+                        self.hitbox.left = hitbox.right
+                    self.rect.centerx = self.hitbox.centerx
+                    self.pos.x = self.hitbox.centerx
+
+                if direction == 'vertical':
+                    if self.direction.y > 0: # moving down
+                        self.hitbox.bottom = hitbox.top
+                    if self.direction.y < 0: # moving up
+                        self.hitbox.top = hitbox.bottom
+                    self.rect.centery = self.hitbox.centery
+                    self.pos.y = self.hitbox.centery
                 
     # 移动
     def move(self, dt):
@@ -219,24 +248,36 @@ class Player(pygame.sprite.Sprite): # Player继承Sprite的功能
         if self.direction.magnitude() > 0:
             self.direction = self.direction.normalize()
 
-        # horizontal movement
-        self.pos.x += self.direction.x * self.speed * dt
-        self.hitbox.centerx = round(self.pos.x)
-        self.rect.centerx = self.hitbox.centerx
-        self.collision('horizontal')
-
-        # vertical movement
-        self.pos.y += self.direction.y * self.speed * dt
-        self.hitbox.centery = round(self.pos.y)
-        self.rect.centery = self.hitbox.centery
-        self.collision('vertical')
+        # dt较大时分成若干子步，每步不超过PLAYER_MAX_STEP，不会穿过薄的碰撞箱
+        steps = max(1, math.ceil(self.speed * dt / PLAYER_MAX_STEP))
+        dt /= steps
+        for _ in range(steps):
+            # horizontal movement
+            self.pos.x += self.direction.x * self.speed * dt
+            self.hitbox.centerx = round(self.pos.x)
+            self.rect.centerx = self.hitbox.centerx
+            self.collision('horizontal')
+
+            # vertical movement
+            self.pos.y += self.direction.y * self.speed * dt
+            self.hitbox.centery = round(self.pos.y)
+            self.rect.centery = self.hitbox.centery
+            self.collision('vertical')
+
+    # 描绘位置相对当前位置的偏移：alpha为两次模拟之间的进度（0~1）
+    def render_offset(self, alpha):
+        if alpha >= 1:
+            return 0, 0
+        position = self.previous_pos.lerp(self.pos, alpha)
+        return round(position.x - self.pos.x), round(position.y - self.pos.y)
 
     # update
     def update(self, dt):
-        self.input()
-        self.get_status()
-        self.update_timers()
+        with profiler.scope('player input'):
+            self.input()
+            self.get_status()
         self.get_target_pos()
 
-        self.move(dt)
+        with profiler.scope('player move'):
+            self.move(dt)
         self.animate(dt)
\ No newline at end of file
@@ -0,0 +1,32 @@
+import pygame
+from settings import *
+from dirty import dirty_rects
+
+WHITE = (255, 255, 255)
+
+# 后期处理：天色和睡觉过渡都是整屏统一的颜色相乘，合成为一种颜色后只做一次全屏混合
+class PostProcess:
+    def __init__(self):
+        self.display_surface = pygame.display.get_surface()
+        self.tint_surf = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.tint_color = None # tint_surf当前填充的颜色，颜色不变时不重新填充
+        self.applied_color = WHITE # 上一帧的颜色，改变时整个画面都变了
+
+    # 合成颜色：各分量相乘（白色不改变画面）
+    def combine(self, colors):
+        r, g, b = WHITE
+        for color in colors:
+            r, g, b = r * color[0] // 255, g * color[1] // 255, b * color[2] // 255
+        return r, g, b
+
+    def apply(self, *colors):
+        color = self.combine(colors)
+        if color != self.applied_color:
+            dirty_rects.invalidate()
+            self.applied_color = color
+        if color == WHITE:
+            return
+        if color != self.tint_color:
+            self.tint_surf.fill(color)
+            self.tint_color = color
+        self.display_surface.blit(self.tint_surf, (0, 0), special_flags = pygame.BLEND_RGB_MULT)
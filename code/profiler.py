@@ -0,0 +1,115 @@
+import json, time
+from collections import deque
+from contextlib import nullcontext
+import pygame
+from settings import *
+from dirty import dirty_rects
+
+# 计时范围：with profiler.scope('名称'): ...
+class Scope:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.profiler.depth += 1
+
+    def __exit__(self, *exc):
+        self.profiler.depth -= 1
+        self.profiler.events.append((self.name, self.start, time.perf_counter() - self.start, self.profiler.depth))
+
+# 帧分析器：记录最近若干帧中每个阶段的耗时，可显示为图表或导出为 Chrome trace
+class Profiler:
+    def __init__(self, history = PROFILER_HISTORY):
+        self.enabled = False # 关闭时scope几乎没有开销
+        self.show = False # 显示图表
+        self.frames = deque(maxlen = history) # 环形缓冲：(帧开始, 帧耗时, [(名称, 开始, 耗时, 深度)])
+        self.events = []
+        self.depth = 0
+        self.frame_start = 0
+        self.origin = time.perf_counter()
+        self.colors = {} # 阶段名 -> 颜色
+        self.font = None
+        self.null_scope = nullcontext()
+
+    def scope(self, name):
+        return Scope(self, name) if self.enabled else self.null_scope
+
+    def begin_frame(self):
+        if self.enabled:
+            self.events = []
+            self.depth = 0
+            self.frame_start = time.perf_counter()
+
+    def end_frame(self):
+        if self.enabled:
+            self.frames.append((self.frame_start, time.perf_counter() - self.frame_start, self.events))
+
+    # F3：显示/隐藏图表（显示时开始记录）
+    def toggle(self):
+        self.show = not self.show
+        self.enabled = self.enabled or self.show
+        if not self.show:
+            dirty_rects.invalidate() # 隐藏后提交整个画面，擦掉最后一帧的图表
+
+    # 导出为 Chrome trace-event JSON（chrome://tracing 或 Perfetto 打开）
+    def export_chrome_trace(self, path):
+        trace_events = []
+        for frame_start, frame_time, events in self.frames:
+            trace_events.append(self.trace_event('frame', frame_start, frame_time))
+            trace_events.extend(self.trace_event(name, start, duration) for name, start, duration, _ in events)
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, file)
+
+    def trace_event(self, name, start, duration):
+        return {
+            'name': name,
+            'ph': 'X',
+            'ts': (start - self.origin) * 1e6,
+            'dur': duration * 1e6,
+            'pid': 1,
+            'tid': 1}
+
+    def color(self, name):
+        if name not in self.colors:
+            self.colors[name] = PROFILER_COLORS[len(self.colors) % len(PROFILER_COLORS)]
+        return self.colors[name]
+
+    # 图表：每帧一列，按顶层阶段堆叠；水平线为 1/60 秒
+    def draw(self, surface):
+        if not self.show:
+            return
+        if self.font is None:
+            self.font = pygame.font.Font(None, 18)
+        dirty_rects.invalidate() # 图表每帧都变化
+
+        width, height = PROFILER_GRAPH_SIZE
+        graph_rect = pygame.Rect(SCREEN_WIDTH - width - 10, 10, width, height)
+        scale = height / 2 / (1000 / 60) # 像素/毫秒，图表高度为两帧(60FPS)
+        pygame.draw.rect(surface, (0, 0, 0), graph_rect)
+
+        frames = list(self.frames)[-width:]
+        totals = {}
+        for column, (_, frame_time, events) in enumerate(frames):
+            x = graph_rect.left + column
+            bottom = graph_rect.bottom
+            for name, _, duration, depth in events:
+                if depth == 0:
+                    top = max(graph_rect.top, bottom - duration * 1000 * scale)
+                    pygame.draw.line(surface, self.color(name), (x, bottom), (x, top))
+                    bottom = top
+                    totals[name] = totals.get(name, 0) + duration
+            frame_top = max(graph_rect.top, graph_rect.bottom - frame_time * 1000 * scale)
+            surface.set_at((x, int(frame_top)), (255, 255, 255))
+        target_y = graph_rect.bottom - 1000 / 60 * scale
+        pygame.draw.line(surface, (255, 255, 255), (graph_rect.left, target_y), (graph_rect.right, target_y))
+
+        # 图例：各阶段的平均耗时
+        y = graph_rect.bottom + 4
+        for name, total in totals.items():
+            text = self.font.render(f'{name} {total / len(frames) * 1000:.2f} ms', True, self.color(name), (0, 0, 0))
+            surface.blit(text, (graph_rect.left, y))
+            y += text.get_height()
+
+profiler = Profiler()
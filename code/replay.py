@@ -0,0 +1,79 @@
+import hashlib, struct, zlib
+from array import array
+import pygame
+from controls import controls, key_mask, KeyState
+from timer import game_clock
+
+# 录像文件：头部（MAGIC、版本、随机种子、帧数、结束时的状态校验）+ 压缩后的每帧 dt 与按键掩码
+MAGIC = b'PDREC'
+VERSION = 3
+HEADER = struct.Struct('<5sHQI20s')
+
+# 游戏状态校验：回放结束时与录制结束时比较，确认完全重现
+def state_checksum(level):
+    player = level.player
+    digest = hashlib.sha1()
+    digest.update(repr((
+        player.pos.x, player.pos.y, player.status,
+        sorted(player.item_inventory.items()), sorted(player.seed_inventory.items()), player.money,
+        level.raining, game_clock.ticks)).encode())
+    soil_layer = level.soil_layer
+    for array in (soil_layer.grid, soil_layer.crop_type, soil_layer.crop_age):
+        digest.update(array.tobytes())
+    for tree in level.tree_sprites:
+        digest.update(repr((tree.rect.topleft, tree.health, len(tree.apple_sprites))).encode())
+    return digest.digest()
+
+# 录制：每帧开始时读取一次键盘，游戏和录像使用同一份按键快照
+class Recorder:
+    def __init__(self, path, seed):
+        self.path = path
+        self.seed = seed
+        self.dts = array('d')
+        self.masks = array('H')
+
+    def frame(self, dt):
+        mask = key_mask(pygame.key.get_pressed())
+        controls.scripted = KeyState.from_mask(mask)
+        self.dts.append(dt)
+        self.masks.append(mask)
+
+    def save(self, level):
+        body = zlib.compress(self.dts.tobytes() + self.masks.tobytes())
+        with open(self.path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, self.seed, len(self.dts), state_checksum(level)))
+            file.write(body)
+
+# 回放：按录像中的 dt 和按键逐帧推进
+class Replay:
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            magic, version, self.seed, frames, self.checksum = HEADER.unpack(file.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f'{path} is not a version {VERSION} recording')
+            body = zlib.decompress(file.read())
+
+        self.dts = array('d')
+        self.dts.frombytes(body[:frames * self.dts.itemsize])
+        self.masks = array('H')
+        self.masks.frombytes(body[frames * self.dts.itemsize:])
+        self.index = 0
+
+    def __len__(self):
+        return len(self.dts)
+
+    @property
+    def finished(self):
+        return self.index >= len(self.dts)
+
+    # 下一帧的 dt（同时设置按键），录像结束时返回 None
+    def next_frame(self):
+        if self.finished:
+            return None
+        controls.scripted = KeyState.from_mask(self.masks[self.index])
+        dt = self.dts[self.index]
+        self.index += 1
+        return dt
+
+    def verify(self, level):
+        return state_checksum(level) == self.checksum
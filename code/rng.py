@@ -0,0 +1,14 @@
+import random
+import numpy as np
+
+# 游戏中所有随机数都来自这里，设置种子后整局游戏可以完全重现（录像回放、基准测试）
+rng = random.Random()
+randint = rng.randint
+choice = rng.choice
+
+def seed(value):
+    rng.seed(value)
+
+# 由共享的随机数生成器派生 NumPy 生成器（如雨粒子），同样受种子控制
+def numpy_rng():
+    return np.random.default_rng(rng.getrandbits(64))
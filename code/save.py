@@ -0,0 +1,186 @@
+import os, io, struct, zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from settings import *
+from soil import PLANT_TYPES
+
+# 存档文件：头部（MAGIC、版本、数据校验）+ 压缩后的数据
+# 数据依次为：玩家、库存、天气、土壤图格、植物、树
+MAGIC = b'PDSAV'
+VERSION = 2
+HEADER = struct.Struct('<5sHI')
+
+# 快照：在主线程上复制当前状态（只复制数值，不涉及sprite），序列化和写入在后台线程进行
+def snapshot(level):
+    player = level.player
+    soil_layer = level.soil_layer
+    return {
+        'player': (player.pos.x, player.pos.y, player.money),
+        'inventories': (dict(player.item_inventory), dict(player.seed_inventory)),
+        'raining': level.raining,
+        'grid': soil_layer.grid.copy(),
+        'crop_type': soil_layer.crop_type.copy(),
+        'crop_age': soil_layer.crop_age.copy(),
+        'trees': [(tree.health, tree.alive, [apple.rect.topleft for apple in tree.apple_sprites])
+            for tree in level.tree_sprites]}
+
+def write_name(out, name):
+    data = name.encode()
+    out.write(struct.pack('<B', len(data)) + data)
+
+def read_name(data):
+    length = data.read(1)[0]
+    return data.read(length).decode()
+
+def unpack(data, fmt):
+    return struct.unpack(fmt, data.read(struct.calcsize(fmt)))
+
+def serialize(state):
+    out = io.BytesIO()
+    out.write(struct.pack('<ddI', *state['player']))
+    for inventory in state['inventories']:
+        out.write(struct.pack('<B', len(inventory)))
+        for name, amount in inventory.items():
+            write_name(out, name)
+            out.write(struct.pack('<I', amount))
+    out.write(struct.pack('<B', state['raining']))
+
+    grid = state['grid']
+    out.write(struct.pack('<HH', *grid.shape))
+    out.write(grid.tobytes())
+
+    # 作物：种类名称表 + 有作物的图格（一维序号、种类编号、生长阶段三个数组）
+    out.write(struct.pack('<B', len(PLANT_TYPES)))
+    for plant_type in PLANT_TYPES:
+        write_name(out, plant_type)
+    cells = np.flatnonzero(state['crop_type']).astype('<u4')
+    out.write(struct.pack('<I', len(cells)))
+    out.write(cells.tobytes())
+    out.write(state['crop_type'].ravel()[cells].tobytes())
+    out.write(state['crop_age'].ravel()[cells].astype('<f8').tobytes())
+
+    out.write(struct.pack('<I', len(state['trees'])))
+    for health, alive, apples in state['trees']:
+        out.write(struct.pack('<bBB', health, alive, len(apples)))
+        for pos in apples:
+            out.write(struct.pack('<HH', *pos))
+    return out.getvalue()
+
+def deserialize(body):
+    data = io.BytesIO(body)
+    state = {'player': unpack(data, '<ddI')}
+    inventories = []
+    for _ in range(2):
+        inventory = {}
+        for _ in range(data.read(1)[0]):
+            name = read_name(data)
+            inventory[name] = unpack(data, '<I')[0]
+        inventories.append(inventory)
+    state['inventories'] = inventories
+    state['raining'] = bool(data.read(1)[0])
+
+    rows, cols = unpack(data, '<HH')
+    state['grid'] = np.frombuffer(data.read(rows * cols), np.uint8).reshape(rows, cols).copy()
+
+    # 存档中的种类编号按名称换成当前的编号
+    plant_types = [read_name(data) for _ in range(data.read(1)[0])]
+    type_map = np.array([0] + [PLANT_TYPES.index(plant_type) + 1 for plant_type in plant_types], np.uint8)
+    count = unpack(data, '<I')[0]
+    cells = np.frombuffer(data.read(count * 4), '<u4')
+    types = np.frombuffer(data.read(count), np.uint8)
+    ages = np.frombuffer(data.read(count * 8), '<f8')
+    state['crop_type'] = np.zeros(rows * cols, np.uint8)
+    state['crop_type'][cells] = type_map[types]
+    state['crop_type'] = state['crop_type'].reshape(rows, cols)
+    state['crop_age'] = np.zeros(rows * cols, np.float64)
+    state['crop_age'][cells] = ages
+    state['crop_age'] = state['crop_age'].reshape(rows, cols)
+
+    state['trees'] = []
+    for _ in range(unpack(data, '<I')[0]):
+        health, alive, apple_count = unpack(data, '<bBB')
+        apples = [unpack(data, '<HH') for _ in range(apple_count)]
+        state['trees'].append((health, bool(alive), apples))
+    return state
+
+# 写入：先写临时文件并fsync，再替换，写到一半退出也不会损坏旧存档
+def write_save(path, state):
+    body = zlib.compress(serialize(state))
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, zlib.crc32(body)))
+        file.write(body)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+# 读取存档，格式不对或数据损坏时抛出ValueError
+def read_save(path):
+    with open(path, 'rb') as file:
+        header = file.read(HEADER.size)
+        body = file.read()
+    if len(header) < HEADER.size:
+        raise ValueError(f'{path} is not a save file')
+    magic, version, checksum = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'{path} is not a version {VERSION} save file')
+    if zlib.crc32(body) != checksum:
+        raise ValueError(f'{path} is damaged')
+    try:
+        return deserialize(zlib.decompress(body))
+    except (zlib.error, struct.error, IndexError, UnicodeDecodeError, ValueError) as error:
+        raise ValueError(f'{path} is damaged') from error
+
+# 把存档状态应用到关卡：直接设置数值并整体重建sprite
+def apply_state(level, state):
+    soil_layer = level.soil_layer
+    if state['grid'].shape != soil_layer.grid.shape or len(state['trees']) != len(level.tree_sprites):
+        raise ValueError('the save file does not match the current map')
+
+    player = level.player
+    x, y, player.money = state['player']
+    player.pos.update(x, y)
+    player.rect.center = (round(x), round(y))
+    player.hitbox.center = player.rect.center
+    player.previous_pos.update(player.pos)
+    player.item_inventory.update(state['inventories'][0])
+    player.seed_inventory.update(state['inventories'][1])
+
+    level.raining = state['raining']
+    soil_layer.raining = level.raining
+    soil_layer.grid[:] = state['grid']
+    soil_layer.rebuild(state['crop_type'], state['crop_age'])
+
+    for tree, (health, alive, apples) in zip(level.tree_sprites.sprites(), state['trees']):
+        tree.health = health
+        if not alive and tree.alive:
+            tree.make_stump()
+        for apple in tree.apple_sprites.sprites():
+            apple.kill()
+        for pos in apples:
+            tree.create_apple(pos)
+
+# 自动存档：每次保存在主线程上只做快照，写入按顺序在后台线程完成
+class Saver:
+    def __init__(self, path):
+        self.path = path
+        self.writer = ThreadPoolExecutor(max_workers = 1)
+        self.pending = None
+
+    def save(self, level):
+        self.pending = self.writer.submit(write_save, self.path, snapshot(level))
+        self.pending.add_done_callback(self.report)
+
+    # 写入失败时立即输出，不等到退出
+    def report(self, future):
+        error = future.exception()
+        if error:
+            print(f'could not save {self.path}: {error}')
+
+    # 等待写入完成（退出前调用），失败已由 report 输出
+    def wait(self):
+        if self.pending:
+            self.pending.exception()
+
+    def load(self, level):
+        apply_state(level, read_save(self.path))
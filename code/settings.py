@@ -3,6 +3,33 @@ from pygame.math import Vector2
 SCREEN_WIDTH = 1280
 SCREEN_HEIGHT = 720
 TILE_SIZE = 64
+CHUNK_SIZE = 512 # 静态图层预烘焙块的边长
+DIRTY_RECT_LIMIT = 300 # 脏矩形多于此数时改为提交整个画面
+
+# world streaming: 以玩家为中心的视口外加边距（像素）
+STREAM_LOAD_MARGIN = 256 # 进入此范围的块立即加载
+STREAM_KEEP_MARGIN = 512 # 离开此范围的块卸载
+STREAM_PREFETCH_MARGIN = 512 # 进入此范围的块在后台解码地面图
+GROUND_IMAGE = '../graphics/world/ground.png'
+GROUND_CHUNK_DIR = '../data/ground' # 地面图切块（自动生成）
+
+# texture atlas（pack_atlas.py 生成）
+ATLAS_INDEX = '../graphics/atlas/atlas.json'
+ATLAS_PAGE_SIZE = 1024
+ATLAS_FOLDERS = [
+	'../graphics/character', '../graphics/soil', '../graphics/soil_water', '../graphics/water', '../graphics/fruit',
+	'../graphics/rain', '../graphics/overlay', '../graphics/stumps', '../graphics/objects']
+
+# timing
+TICK_RATE = 60 # 每秒模拟次数（固定步长，与描绘帧率无关）
+FPS_LIMIT = 0 # 描绘帧率上限，0为不限制
+VSYNC = True # 与显示器刷新同步（不支持时忽略）
+MAX_FRAME_TIME = 0.25 # 一帧最多追赶的模拟时间（秒），避免卡顿后越追越慢
+TRANSITION_SPEED = 240 # 睡觉过渡的淡入淡出速度（颜色值/秒）
+PLAYER_MAX_STEP = 8 # 玩家每个移动子步的最大距离（像素），小于最薄的碰撞箱，防止穿过
+
+# save
+SAVE_FILE = '../savegame.dat' # 每天开始时在后台自动保存
 
 # overlay positions 
 OVERLAY_POSITIONS = {
@@ -39,6 +66,18 @@ LAYERS = {
 	'rain drops': 10
 }
 
+# rain
+RAIN_DENSITY = 15 # 每秒在一个屏幕大小的区域内生成的雨滴数
+RAIN_MAX_PARTICLES = 512 # 粒子池大小（每帧开销的上限）
+RAIN_DIRECTION = (-2, 4) # 雨滴运动方向（乘以速度）
+RAIN_SPAWN_MARGIN = (350, 700) # 生成区域在视口右侧、上方的扩展量
+
+# profiler
+PROFILER_HISTORY = 600 # 记录的帧数
+PROFILER_GRAPH_SIZE = (240, 100)
+PROFILER_COLORS = [(230, 80, 80), (80, 200, 80), (90, 140, 240), (240, 200, 60), (200, 90, 220), (60, 210, 210), (250, 140, 40), (180, 180, 180)]
+PROFILER_TRACE_FILE = '../profile_trace.json' # F4 导出的位置
+
 APPLE_POS = {
 	'Small': [(18,17), (30,37), (12,50), (30,45), (20,30), (30,10)],
 	'Large': [(30,24), (60,65), (50,50), (16,40),(45,50), (42,70)]
@@ -1,113 +1,132 @@
 import pygame
 from settings import *
 from support import import_folder
-from sprites import Generic
-from random import randint, choice
+import numpy as np
+from rng import numpy_rng
+from dirty import dirty_rects
+
+# 雨粒子状态
+FREE = 0
+DROP = 1
+SPLASH = 2
 
 # 白天夜晚过渡
 class Sky:
     def __init__(self):
-        self.display_suface = pygame.display.get_surface()
-        self.full_surf = pygame.Surface((SCREEN_WIDTH,SCREEN_HEIGHT))
         self.start_color = [255,255,255]
         self.end_color = (38,101,189) # 夜晚颜色值
 
-    def display(self,dt,shop_active):
+    def update(self,dt,shop_active):
         for index, value in enumerate(self.end_color):
             if self.start_color[index] > value and not shop_active: # 变暗
                 self.start_color[index] -= 2 *dt
 
-        self.full_surf.fill(self.start_color)
-        self.display_suface.blit(self.full_surf, (0,0), special_flags = pygame.BLEND_RGBA_MULT)
-
-# 落雨
-class Drop(Generic):
-    def __init__(self, surf, pos, moving, groups, z):
-
-        self.groups = groups
-
-        # general setup
-        super().__init__(pos, surf, groups, z)
-        self.lifetime = randint(700,800) # 生存时间
-        self.start_time = pygame.time.get_ticks() # 起始时间
-
-        # moving
-        self.moving = moving
-        if self.moving:
-            # movement attributes
-            self.pos = pygame.math.Vector2(self.rect.topleft)
-            self.direction = pygame.math.Vector2(-2,4)
-            self.speed = randint(200,250)
-        
-    def update(self,dt):
-        # movement
-        if self.moving:
-            self.pos += self.direction * self.speed * dt
-            self.rect.topleft = (round(self.pos.x), round(self.pos.y))
-
-        # timer
-        if pygame.time.get_ticks() - self.start_time >= self.lifetime:
-            Floor(pos = self.pos, groups = self.groups)
-            self.kill()
-
-# 落雨水花
-class Floor(Generic):
-    def __init__(self, pos, groups):
-
-        floor_frames = import_folder('../graphics/rain/floor')
-
-        # animation setup
-        self.frames = floor_frames # 图片列表
-        self.frame_index = 0 # 图片索引
-
-        # general setup
-        super().__init__(
-            pos = pos, 
-            surf = self.frames[self.frame_index], 
-            groups = groups, 
-            z = LAYERS['rain floor'])
-        
-    def animate(self, dt):
-        # 归零，循环
-        self.frame_index += 5 * dt
-        if self.frame_index >= len(self.frames):
-            self.kill()
-        else:
-            # 图片更新
-            self.image = self.frames[int(self.frame_index)]
-
-    def update(self,dt):
-        self.animate(dt)
-
-# 雨
+    # 当前的天色（由后期处理与其他颜色合成后相乘到画面上）
+    def tint(self):
+        return tuple(int(value) for value in self.start_color)
+
+# 雨：粒子池，位置、速度、寿命存放在连续的数组中，批量更新和描绘
 class Rain:
-    def __init__(self, all_sprites):
+    def __init__(self, all_sprites, world_rect):
 
         self.all_sprites = all_sprites
-        self.rain_drops = import_folder('../graphics/rain/drops/')
-        self.rain_floor = import_folder('../graphics/rain/floor/')
-        self.floor_w, self.floor_h = pygame.image.load('../graphics/world/ground.png').get_size()
-
-    # # 创造落雨水花
-    # def create_floor(self):
-    #     Drop(
-    #         surf = choice(self.rain_floor), # 随机图片
-    #         pos = (randint(0,self.floor_w),randint(0,self.floor_h)), # 随机位置
-    #         moving = False,
-    #         groups = self.all_sprites,
-    #         z = LAYERS['rain floor'])
+        self.world_rect = world_rect # 地图范围（不需要加载地面图）
+        self.rng = numpy_rng()
+
+        # particle pool
+        size = RAIN_MAX_PARTICLES
+        self.state = np.zeros(size, np.int8) # FREE / DROP / SPLASH
+        self.pos = np.zeros((size, 2), np.float32) # 左上角位置
+        self.velocity = np.zeros((size, 2), np.float32)
+        self.lifetime = np.zeros(size, np.float32) # 雨滴剩余时间（秒）
+        self.frame = np.zeros(size, np.float32) # 雨滴图片索引 / 水花动画帧
+        self.emit_amount = 0.0 # 累积的待生成数量（按dt计算，与帧率无关）
+        self.lag = 0.0 # 描绘时刻落后于模拟的时间（秒），雨滴按速度往回插值
+        self.drawn_rects = {DROP: [], SPLASH: []} # 上一帧描绘的位置（脏矩形）
+
+        # 在摄像组对应的层中描绘
+        self.all_sprites.add_batch(LAYERS['rain floor'], self.draw_floor)
+        self.all_sprites.add_batch(LAYERS['rain drops'], self.draw_drops)
+
+    # 雨的图片第一次下雨时才加载
+    @property
+    def rain_drops(self):
+        return import_folder('../graphics/rain/drops/')
+
+    @property
+    def rain_floor(self):
+        return import_folder('../graphics/rain/floor/')
+
+    # 生成区域：视口向上、向右扩展，让雨滴飘入视口（与世界范围取交集）
+    def spawn_area(self):
+        view = self.all_sprites.view
+        area = pygame.Rect(view.left, view.top - RAIN_SPAWN_MARGIN[1], view.width + RAIN_SPAWN_MARGIN[0], view.height + RAIN_SPAWN_MARGIN[1])
+        return area.clip(self.world_rect)
 
     # 创造落雨
-    def create_drops(self):
-        Drop(
-            surf = choice(self.rain_drops), # 随机图片
-            pos = (randint(0,self.floor_w),randint(0,self.floor_h)), # 随机位置
-            moving = True,
-            groups = self.all_sprites,
-            z = LAYERS['rain drops'])
-
-    # 更新 
-    def update(self):
-        # self.create_floor()
-        self.create_drops()
-
+    def create_drops(self, dt):
+        area = self.spawn_area()
+        self.emit_amount += RAIN_DENSITY * dt * (area.width * area.height) / (SCREEN_WIDTH * SCREEN_HEIGHT)
+        count = int(self.emit_amount)
+        self.emit_amount -= count
+
+        free = np.flatnonzero(self.state == FREE)[:count] # 粒子池满时不再生成
+        if not free.size or not area.width or not area.height:
+            return
+        rng = self.rng
+        self.state[free] = DROP
+        self.pos[free, 0] = rng.integers(area.left, area.right, free.size)
+        self.pos[free, 1] = rng.integers(area.top, area.bottom, free.size)
+        self.velocity[free] = np.outer(rng.integers(200, 251, free.size), RAIN_DIRECTION)
+        self.lifetime[free] = rng.integers(700, 801, free.size) / 1000
+        self.frame[free] = rng.integers(0, len(self.rain_drops), free.size)
+
+    # 更新
+    def update(self, dt, raining = True):
+        if raining:
+            self.create_drops(dt)
+
+        drops = self.state == DROP
+        self.pos[drops] += self.velocity[drops] * dt
+        self.lifetime[drops] -= dt
+
+        # 雨滴落地变成水花
+        landed = drops & (self.lifetime <= 0)
+        self.state[landed] = SPLASH
+        self.frame[landed] = 0
+
+        # 水花动画播放完后回收
+        splashes = (self.state == SPLASH) & ~landed
+        if splashes.any():
+            self.frame[splashes] += 5 * dt
+            self.state[splashes & (self.frame >= len(self.rain_floor))] = FREE
+
+    # 批量描绘视口内的粒子（没有粒子时不加载图片）
+    def draw_particles(self, surface, view, state):
+        rects = []
+        visible = np.flatnonzero(self.state == state)
+        if visible.size:
+            frames = self.rain_drops if state == DROP else self.rain_floor
+            frame_w, frame_h = frames[0].get_size()
+            x, y = self.pos[visible, 0], self.pos[visible, 1]
+            visible = visible[(x > view.left - frame_w) & (x < view.right) &
+                (y > view.top - frame_h) & (y < view.bottom)]
+        if visible.size:
+            pos = self.pos[visible]
+            if state == DROP and self.lag:
+                pos = pos - self.velocity[visible] * self.lag
+            positions = np.rint(pos - view.topleft).astype(int).tolist()
+            images = [frames[index] for index in self.frame[visible].astype(int).tolist()]
+            surface.blits(zip(images, positions), doreturn = False)
+            if dirty_rects.enabled:
+                rects = [image.get_rect(topleft = position) for image, position in zip(images, positions)]
+        if dirty_rects.enabled:
+            dirty_rects.add_all(self.drawn_rects[state])
+            dirty_rects.add_all(rects)
+            self.drawn_rects[state] = rects
+
+    def draw_drops(self, surface, view):
+        self.draw_particles(surface, view, DROP)
+
+    def draw_floor(self, surface, view):
+        self.draw_particles(surface, view, SPLASH)
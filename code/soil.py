@@ -1,8 +1,26 @@
 import pygame
 from settings import *
-from pytmx.util_pygame import load_pygame
+from tilemap import load_map
 from support import *
-from random import choice
+from rng import choice
+from spatial import SpatialGroup, refresh
+import numpy as np
+
+# 土壤图格状态位
+FARMABLE = 1 # 可耕地
+TILLED = 2 # 已耕地
+WATERED = 4 # 已浇水
+PLANTED = 8 # 已播种
+
+# 作物种类，数组中的种类编号为序号+1（0表示没有作物）
+PLANT_TYPES = list(GROW_SPEED)
+
+# 耕地图块类型查找表：邻居掩码（上=1, 下=2, 右=4, 左=8）-> 图片名
+SOIL_TILE_TYPES = (
+    'o', 'b', 't', 'tb',
+    'l', 'bl', 'tl', 'tbr',
+    'r', 'br', 'tr', 'tbl',
+    'lr', 'lrt', 'lrb', 'x')
 
 # 耕地类
 class SoilTile(pygame.sprite.Sprite):
@@ -20,46 +38,24 @@ class WaterTile(pygame.sprite.Sprite):
         self.rect = self.image.get_rect(topleft = pos)
         self.z = LAYERS['soil water']
 
-# 植物类
+# 植物：只负责显示，生长状态存放在 SoilLayer 的数组中，生长阶段改变时才更新图片
 class Plant(pygame.sprite.Sprite):
-    def __init__(self, plant_type, groups, soil, check_watered):
+    def __init__(self, plant_type, frames, cell, groups):
         super().__init__(groups)
-        
-        # set up
         self.plant_type = plant_type
-        self.frames = import_folder(f'../graphics/fruit/{plant_type}')
-        self.soil = soil
-        self.check_watered = check_watered
-
-        # plant growing
-        self.age = 0
-        self.max_age = len(self.frames) - 1
-        self.grow_speed = GROW_SPEED[plant_type]
-        self.harvestable = False
-
-        # sprite setup
-        self.image = self.frames[self.age]
-        # self.y_offset = -16 if plant_type == 'corn' else -8
-        # self.rect = self.image.get_rect(midbottom = soil.rect.midbottom + pygame.math.Vector2(0,self.y_offset))
-        self.rect = self.image.get_rect(center = soil.rect.center)
-        self.z = LAYERS['ground plant']
-
-    # 生长
-    def grow(self):
-        if self.check_watered(self.rect.center): # 检测是否浇水
-            self.age += self.grow_speed # 生长
-
-            if int(self.age) > 0:
-                self.z = LAYERS['main'] # 成长后可遮蔽
-                # 成长后可碰撞
-                self.hitbox = self.rect.copy().inflate(-26,-self.rect.height * 0.4)
-            
-            if self.age >= self.max_age: # 是否成熟
-                self.age = self.max_age
-                self.harvestable = True
-
-            self.image = self.frames[int(self.age)] # 更新图片 
-            self.rect = self.image.get_rect(center = self.soil.rect.center)
+        self.frames = frames
+        self.cell = cell
+        self.set_stage(0)
+
+    def set_stage(self, stage):
+        self.image = self.frames[stage]
+        self.rect = self.image.get_rect(center = ((self.cell[0] + 0.5) * TILE_SIZE, (self.cell[1] + 0.5) * TILE_SIZE))
+        if stage > 0:
+            self.z = LAYERS['main'] # 成长后可遮蔽
+            self.hitbox = self.rect.copy().inflate(-26,-self.rect.height * 0.4) # 成长后可碰撞
+        else:
+            self.z = LAYERS['ground plant']
+        refresh(self) # z、rect和碰撞箱改变
 
 
 # 土壤层
@@ -70,85 +66,91 @@ class SoilLayer:
         self.all_sprites = all_sprites
         self.collision_sprites = collision_sprites
         self.soil_sprites = pygame.sprite.Group()
+        self.soil_tiles = {} # (列, 行) -> SoilTile
         self.water_sprites = pygame.sprite.Group()
-        self.plant_sprites = pygame.sprite.Group()
+        self.plant_sprites = SpatialGroup()
+        self.plant_cells = {} # (列, 行) -> Plant
 
         # graphics
         self.soil_surfs = import_folder_dict('../graphics/soil')
         self.water_surfs = import_folder('../graphics/soil_water')
 
         self.create_soil_grid()
-        self.create_hit_rects()
 
         # sounds
-        self.hoe_sound = pygame.mixer.Sound('../audio/hoe.wav')
+        self.hoe_sound = import_sound('../audio/hoe.wav')
         self.hoe_sound.set_volume(0.1)
 
-        self.plant_sound = pygame.mixer.Sound('../audio/plant.wav')
+        self.plant_sound = import_sound('../audio/plant.wav')
         self.plant_sound.set_volume(0.1)
 
     # 创建土壤图格
     def create_soil_grid(self):
-        # 加载背景
-        ground = pygame.image.load('../graphics/world/ground.png')
-        # 水平、垂直图格数
-        h_tiles, v_tiles = ground.get_width() // TILE_SIZE, ground.get_height() // TILE_SIZE
-        # 二维列表
-        self.grid = [[[] for col in range(h_tiles)] for row in range(v_tiles)]
-        for x, y, _ in load_pygame('../data/map.tmx').get_layer_by_name('Farmable').tiles():
-            self.grid[y][x].append('F')
-        
-    # 可耕地图格列表
-    def create_hit_rects(self):
-        self.hit_rect = [] # 创建列表
-        for index_row, row in enumerate(self.grid):
-            for index_col, cell in enumerate(row):
-                if 'F' in cell: # 可耕地图格
-                    x = index_col * TILE_SIZE
-                    y = index_row * TILE_SIZE
-                    rect = pygame.Rect(x, y, TILE_SIZE, TILE_SIZE)
-                    self.hit_rect.append(rect)
+        # 二维数组，大小与地图相同（不需要加载地面图），每个图格一个字节，按位存放状态
+        farmable = load_map('../data/map.tmx').get_layer_by_name('Farmable')
+        mask = np.frombuffer(farmable.mask(), np.uint8).reshape(farmable.height, farmable.width)
+        self.grid = mask * np.uint8(FARMABLE)
+
+        # 作物状态：与土壤图格同形的数组，生长在 update_plants 中一次算完
+        self.crop_type = np.zeros(self.grid.shape, np.uint8)
+        self.crop_age = np.zeros(self.grid.shape, np.float64)
+        self.crop_harvestable = np.zeros(self.grid.shape, bool)
+        # 按种类编号查表
+        self.crop_speed = np.array([0] + [GROW_SPEED[plant_type] for plant_type in PLANT_TYPES], np.float64)
+        self.crop_max_age = np.zeros(len(PLANT_TYPES) + 1, np.float64) # 第一次种植该作物时设置
+        self.crop_frames = {} # 种类 -> 图片列表（用到时才加载）
+
+    # 目标点所在的图格（直接按 TILE_SIZE 取整寻址），超出土壤范围时返回None
+    def get_cell(self, point):
+        x = int(point[0]) // TILE_SIZE
+        y = int(point[1]) // TILE_SIZE
+        if 0 <= y < self.grid.shape[0] and 0 <= x < self.grid.shape[1]:
+            return x, y
+        return None
 
     # 耕地
     def get_hit(self, point):
-        for rect in self.hit_rect:
-            if rect.collidepoint(point):
-                self.hoe_sound.play() # 播放音效
-                x = rect.x // TILE_SIZE
-                y = rect.y // TILE_SIZE
-
-                if 'F' in self.grid[y][x]:
-                    self.grid[y][x].append('X') # 图格添加耕地标识
-                    self.create_soil_tiles() # 调用创建耕地函数
-                    if self.raining:
-                        self.water_all()
+        cell = self.get_cell(point)
+        if cell and self.grid[cell[1], cell[0]] & FARMABLE:
+            self.hoe_sound.play() # 播放音效
+            x, y = cell
+
+            if not self.grid[y, x] & TILLED:
+                self.grid[y, x] |= TILLED # 图格添加耕地标识
+                self.update_soil_tiles_around(x, y) # 只更新受影响的耕地图块
+                if self.raining:
+                    self.water_cell(x, y)
+
+    # 给一个已耕地的图格浇水
+    def water_cell(self, x, y):
+        if not self.grid[y, x] & WATERED:
+            # add an entry to the soil grid -> watered
+            self.grid[y, x] |= WATERED
+
+            # create the watered soil
+            WaterTile(
+                pos = (x * TILE_SIZE, y * TILE_SIZE),
+                surf = choice(self.water_surfs),
+                groups = [self.all_sprites, self.water_sprites])
 
     # 浇水
     def water(self, target_pos):
-        for soil_sprite in self.soil_sprites.sprites():
-            if soil_sprite.rect.collidepoint(target_pos):
-                
-                # add an entry to the soil grid -> 'w'
-                x = soil_sprite.rect.x // TILE_SIZE
-                y = soil_sprite.rect.y // TILE_SIZE
-                self.grid[y][x].append('W')
-
-                # create the watered soil
-                WaterTile(
-                    pos = soil_sprite.rect.topleft,
-                    surf = choice(self.water_surfs),
-                    groups = [self.all_sprites, self.water_sprites])
+        cell = self.get_cell(target_pos)
+        if cell in self.soil_tiles:
+            self.water_cell(*cell)
 
     # 雨水灌溉 water all
     def water_all(self):
-        for index_row, row in enumerate(self.grid):
-            for index_col, cell in enumerate(row):
-                if 'X' in cell and 'W' not in cell:
-                    cell.append('W')
-                    WaterTile(
-                    pos = (index_col * TILE_SIZE, index_row * TILE_SIZE),
-                    surf = choice(self.water_surfs),
-                    groups = [self.all_sprites, self.water_sprites])
+        dry = (self.grid & (TILLED | WATERED)) == TILLED # 已耕地但未浇水
+        self.create_water_tiles(dry)
+        self.grid[dry] |= WATERED
+
+    def create_water_tiles(self, cells):
+        for index_row, index_col in np.argwhere(cells).tolist():
+            WaterTile(
+                pos = (index_col * TILE_SIZE, index_row * TILE_SIZE),
+                surf = choice(self.water_surfs),
+                groups = [self.all_sprites, self.water_sprites])
 
     # 移除浇水
     def remove_water(self):
@@ -158,84 +160,118 @@ class SoilLayer:
             sprite.kill()
 
         # clean up the grid
-        for row in self.grid:
-            # for cell in row:
-            #     if 'W' in cell:
-            #         cell.remove('W')
-            for i, cell in enumerate(row): # 过滤掉所有的 'W'，保留其他内容
-                row[i] = [element for element in cell if element != 'W']
-
-    # 检测浇水
-    def check_watered(self, pos):
-        x = pos[0] // TILE_SIZE
-        y = pos[1] // TILE_SIZE
-        cell = self.grid[y][x]
-        is_watered = 'W' in cell
-        return is_watered
-    
+        self.grid &= ~np.uint8(WATERED)
+
     # 播种
     def plant_seed(self, target_pos, seed):
-        for soil_sprite in self.soil_sprites.sprites():
-            if soil_sprite.rect.collidepoint(target_pos):
-                self.plant_sound.play() # 播放音效
-
-                # add an entry to the soil grid -> 'P'
-                x = soil_sprite.rect.x // TILE_SIZE
-                y = soil_sprite.rect.y // TILE_SIZE
-                
-                if 'P' not in self.grid[y][x]:
-                    self.grid[y][x].append('P')
-                    Plant(
-                        plant_type = seed,
-                        groups = [self.all_sprites, self.plant_sprites, self.collision_sprites], 
-                        soil = soil_sprite, 
-                        check_watered = self.check_watered)
-
+        cell = self.get_cell(target_pos)
+        if cell in self.soil_tiles:
+            self.plant_sound.play() # 播放音效
+
+            # add an entry to the soil grid -> planted
+            x, y = cell
+            if not self.grid[y, x] & PLANTED:
+                self.grid[y, x] |= PLANTED
+                self.create_plant(cell, seed, 0)
+
+    def get_frames(self, plant_type):
+        if plant_type not in self.crop_frames:
+            self.crop_frames[plant_type] = import_folder(f'../graphics/fruit/{plant_type}')
+            self.crop_max_age[PLANT_TYPES.index(plant_type) + 1] = len(self.crop_frames[plant_type]) - 1
+        return self.crop_frames[plant_type]
+
+    def create_plant(self, cell, plant_type, age):
+        frames = self.get_frames(plant_type)
+        x, y = cell
+        self.crop_type[y, x] = PLANT_TYPES.index(plant_type) + 1
+        self.crop_age[y, x] = age
+        self.crop_harvestable[y, x] = age >= len(frames) - 1
+        plant = Plant(plant_type, frames, cell, [self.all_sprites, self.plant_sprites, self.collision_sprites])
+        if int(age):
+            plant.set_stage(int(age))
+        self.plant_cells[cell] = plant
+
+    def is_harvestable(self, plant):
+        return self.crop_harvestable[plant.cell[1], plant.cell[0]]
+
+    # 收获：删除植物并清除播种标识
+    def remove_plant(self, plant):
+        plant.kill()
+        x, y = plant.cell
+        del self.plant_cells[plant.cell]
+        self.grid[y, x] &= ~np.uint8(PLANTED)
+        self.crop_type[y, x] = 0
+        self.crop_age[y, x] = 0
+        self.crop_harvestable[y, x] = False
+
+    # 新的一天：浇过水的作物一起生长，只更新生长阶段改变了的植物
     def update_plants(self):
-        for plant in self.plant_sprites.sprites():
-            plant.grow()
-
-    # 创建耕地
+        growing = (self.crop_type != 0) & ((self.grid & WATERED) != 0) & ~self.crop_harvestable
+        if not growing.any():
+            return
+        types = self.crop_type[growing]
+        old_age = self.crop_age[growing]
+        max_age = self.crop_max_age[types]
+        age = np.minimum(old_age + self.crop_speed[types], max_age)
+        self.crop_age[growing] = age
+        self.crop_harvestable[growing] = age >= max_age
+
+        stage = age.astype(int)
+        changed = stage != old_age.astype(int)
+        for (y, x), new_stage in zip(np.argwhere(growing)[changed].tolist(), stage[changed].tolist()):
+            self.plant_cells[(x, y)].set_stage(new_stage)
+
+    # 创建所有耕地（整体重建，如加载存档时）
     def create_soil_tiles(self):
-        self.soil_sprites.empty()
-        for index_row, row in enumerate(self.grid):
-            for index_col, cell in enumerate(row):
-                if 'X' in cell: # 图格是耕地
-
-                    # tile options
-                    t = 'X' in self.grid[index_row -1][index_col]
-                    b = 'X' in self.grid[index_row +1][index_col]
-                    r = 'X' in self.grid[index_row][index_col + 1]
-                    l = 'X' in self.grid[index_row][index_col - 1]
-
-                    tile_type = 'o'
-
-                    # all sides
-                    if all((t,b,r,l)): tile_type = 'x'
-
-                    # horizontal tiles only
-                    if l and not any((t,b,r)): tile_type = 'r'
-                    if r and not any((t,b,l)): tile_type = 'l'
-                    if l and r and not any((t,b)): tile_type = 'lr'
-
-                    # vertical only
-                    if t and not any((b,r,l)): tile_type = 'b'
-                    if b and not any((t,r,l)): tile_type = 't'
-                    if t and b and not any((r,l)): tile_type = 'tb'
-
-                    # corners
-                    if b and l and not any((t,r)): tile_type = 'tr'
-                    if b and r and not any((t,l)): tile_type = 'tl'
-                    if t and l and not any((b,r)): tile_type = 'br'
-                    if t and r and not any((b,l)): tile_type = 'bl'
-
-                    # T shapes
-                    if all((t,b,r)) and not l: tile_type = 'tbr'
-                    if all((t,b,l)) and not r: tile_type = 'tbl'
-                    if all((l,r,t)) and not b: tile_type = 'lrt'
-                    if all((l,r,b)) and not t: tile_type = 'lrb'
-
-                    SoilTile(
-                        pos = (index_col * TILE_SIZE, index_row * TILE_SIZE),
-                        surf = self.soil_surfs[tile_type],
-                        groups = [self.all_sprites, self.soil_sprites])
+        for soil_sprite in self.soil_tiles.values():
+            soil_sprite.kill()
+        self.soil_tiles.clear()
+
+        tilled = np.pad((self.grid & TILLED) != 0, 1)
+        masks = (tilled[:-2, 1:-1] * 1) | (tilled[2:, 1:-1] * 2) | (tilled[1:-1, 2:] * 4) | (tilled[1:-1, :-2] * 8)
+        for index_row, index_col in np.argwhere(tilled[1:-1, 1:-1]).tolist(): # 图格是耕地
+            self.soil_tiles[(index_col, index_row)] = SoilTile(
+                pos = (index_col * TILE_SIZE, index_row * TILE_SIZE),
+                surf = self.soil_surfs[SOIL_TILE_TYPES[masks[index_row, index_col]]],
+                groups = [self.all_sprites, self.soil_sprites])
+
+    # 整体重建所有sprite（读取存档后）：耕地、浇水的耕地、植物（按 crop_type、crop_age 数组）
+    def rebuild(self, crop_type, crop_age):
+        for sprite in self.water_sprites.sprites() + self.plant_sprites.sprites():
+            sprite.kill()
+        self.plant_cells.clear()
+        self.crop_type[:] = 0
+        self.crop_age[:] = 0
+        self.crop_harvestable[:] = False
+        self.create_soil_tiles()
+        self.create_water_tiles((self.grid & (TILLED | WATERED)) == (TILLED | WATERED))
+        for y, x in np.argwhere(crop_type).tolist():
+            self.create_plant((x, y), PLANT_TYPES[crop_type[y, x] - 1], crop_age[y, x])
+
+    def is_tilled(self, x, y):
+        return 0 <= y < self.grid.shape[0] and 0 <= x < self.grid.shape[1] and bool(self.grid[y, x] & TILLED)
+
+    # 重新计算一个图格的耕地图块，已有的sprite原地更新图片
+    def update_soil_tile(self, x, y):
+        soil_sprite = self.soil_tiles.get((x, y))
+        if not self.is_tilled(x, y):
+            if soil_sprite:
+                soil_sprite.kill()
+                del self.soil_tiles[(x, y)]
+            return
+
+        # tile options
+        mask = self.is_tilled(x, y - 1) | self.is_tilled(x, y + 1) << 1 | self.is_tilled(x + 1, y) << 2 | self.is_tilled(x - 1, y) << 3
+        surf = self.soil_surfs[SOIL_TILE_TYPES[mask]]
+        if soil_sprite:
+            soil_sprite.image = surf
+        else:
+            self.soil_tiles[(x, y)] = SoilTile(
+                pos = (x * TILE_SIZE, y * TILE_SIZE),
+                surf = surf,
+                groups = [self.all_sprites, self.soil_sprites])
+
+    # 耕地改变时只更新该图格及上下左右四个邻居
+    def update_soil_tiles_around(self, x, y):
+        for dx, dy in ((0, 0), (0, -1), (0, 1), (1, 0), (-1, 0)):
+            self.update_soil_tile(x + dx, y + dy)
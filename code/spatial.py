@@ -0,0 +1,121 @@
+import pygame
+from settings import *
+
+# 均匀网格空间索引：物体按rect登记到覆盖的格子，查询只看附近格子
+class SpatialHash:
+    def __init__(self, cell_size = TILE_SIZE):
+        self.cell_size = cell_size
+        self.cells = {} # (列, 行) -> {物体: None}
+        self.items = {} # 物体 -> (登记序号, 格子范围)
+        self.count = 0
+
+    def cell_range(self, rect):
+        size = self.cell_size
+        left, top = rect.left // size, rect.top // size
+        right = max(left, (rect.right - 1) // size)
+        bottom = max(top, (rect.bottom - 1) // size)
+        return left, top, right, bottom
+
+    def insert(self, item, rect):
+        cell_range = self.cell_range(rect)
+        self.items[item] = (self.count, cell_range)
+        self.count += 1
+        self.add_to_cells(item, cell_range)
+
+    def remove(self, item):
+        _, cell_range = self.items.pop(item)
+        left, top, right, bottom = cell_range
+        for col in range(left, right + 1):
+            for row in range(top, bottom + 1):
+                cell = self.cells[(col, row)]
+                del cell[item]
+                if not cell:
+                    del self.cells[(col, row)]
+
+    # 物体移动或rect改变后调用，格子范围不变时不做任何事
+    def update(self, item, rect):
+        cell_range = self.cell_range(rect)
+        order, old_range = self.items[item]
+        if cell_range != old_range:
+            self.remove(item)
+            self.items[item] = (order, cell_range)
+            self.add_to_cells(item, cell_range)
+
+    def add_to_cells(self, item, cell_range):
+        left, top, right, bottom = cell_range
+        for col in range(left, right + 1):
+            for row in range(top, bottom + 1):
+                self.cells.setdefault((col, row), {})[item] = None
+
+    # 返回与rect所在格子重叠的物体（按登记顺序），调用者再做精确检测
+    def query(self, rect):
+        left, top, right, bottom = self.cell_range(rect)
+        if left == right and top == bottom:
+            return list(self.cells.get((left, top), ()))
+
+        found = {}
+        for col in range(left, right + 1):
+            for row in range(top, bottom + 1):
+                cell = self.cells.get((col, row))
+                if cell:
+                    found.update(cell)
+        return sorted(found, key = lambda item: self.items[item][0])
+
+    def query_point(self, point):
+        size = self.cell_size
+        return list(self.cells.get((int(point[0]) // size, int(point[1]) // size), ()))
+
+# 按sprite的z、rect或碰撞箱建立索引的sprite组（渲染队列、空间索引），这些属性改变后需要refresh
+class IndexedGroup(pygame.sprite.Group):
+    def refresh(self, sprite):
+        pass
+
+# sprite的z、rect或碰撞箱改变后调用，更新它所在的所有索引组
+def refresh(sprite):
+    for group in sprite.groups():
+        if isinstance(group, IndexedGroup):
+            group.refresh(sprite)
+
+# 带空间索引的sprite组，key为用于索引的rect属性名（'rect' 或 'hitbox'）
+class SpatialGroup(IndexedGroup):
+    def __init__(self, key = 'rect', *sprites):
+        self.key = key
+        self.index = SpatialHash()
+        # 新加入的sprite在查询前才登记（加入组时rect/hitbox可能还未设置）
+        self.pending = {}
+        super().__init__(*sprites)
+
+    def add_internal(self, sprite, layer = None):
+        super().add_internal(sprite, layer)
+        self.pending[sprite] = None
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        if sprite in self.pending:
+            del self.pending[sprite]
+        elif sprite in self.index.items:
+            self.index.remove(sprite)
+
+    # sprite的rect/hitbox改变（或新获得hitbox）后调用
+    def refresh(self, sprite):
+        if sprite in self.index.items:
+            self.index.update(sprite, getattr(sprite, self.key))
+        elif self.has(sprite):
+            self.pending[sprite] = None
+
+    def flush_pending(self):
+        for sprite in self.pending:
+            # 没有hitbox的sprite（未长大的植物）不参与查询，获得后需refresh
+            if hasattr(sprite, self.key):
+                self.index.insert(sprite, getattr(sprite, self.key))
+        self.pending.clear()
+
+    def query(self, rect):
+        if self.pending:
+            self.flush_pending()
+        return self.index.query(rect)
+
+    def query_point(self, point):
+        if self.pending:
+            self.flush_pending()
+        return self.index.query_point(point)
@@ -1,7 +1,10 @@
 import pygame
+from weakref import WeakKeyDictionary
 from settings import *
-from random import randint, choice
-from timer import Timer
+from rng import randint, choice
+from timer import world_timers
+from support import import_image, import_sound
+from spatial import refresh
 
 # 通用类
 class Generic(pygame.sprite.Sprite):
@@ -35,10 +38,8 @@ class Water(Generic):
             z = LAYERS['water'])
         
     def animate(self, dt):
-        # 归零，循环
-        self.frame_index += 5 * dt
-        if self.frame_index >= len(self.frames):
-            self.frame_index = 0
+        # 按游戏世界的时间计算帧，之后加载的水面与已有的同步
+        self.frame_index = world_timers.ticks / 1000 * 5 % len(self.frames)
         # 图片更新
         self.image = self.frames[int(self.frame_index)]
 
@@ -51,24 +52,42 @@ class WildFlower(Generic):
         # 单独设置花的碰撞箱
         self.hitbox = self.rect.copy().inflate(-20, -self.rect.height * 0.9)
 
-# 粒子效果
-class Particale(Generic):
-    def __init__(self, pos, surf, groups, z, duration = 200):
-        super().__init__(pos, surf, groups, z)
-        self.start_time = pygame.time.get_ticks()
-        self.duration = duration
+# 白色剪影缓存：每个源surface只生成一次（源surface释放后自动移除）
+silhouettes = WeakKeyDictionary()
 
-        # white surface
-        mask_surf = pygame.mask.from_surface(self.image) # 得到黑白图片，有色像素为白，透明像素为黑
+def silhouette(surf):
+    if surf not in silhouettes:
+        mask_surf = pygame.mask.from_surface(surf) # 得到黑白图片，有色像素为白，透明像素为黑
         new_surf = mask_surf.to_surface()
         new_surf.set_colorkey((0,0,0)) # 将黑色换成透明色
-        self.image = new_surf # 更新图片
+        silhouettes[surf] = new_surf
+    return silhouettes[surf]
 
-    def update(self,dt):
-        current_time = pygame.time.get_ticks()
-        # 计时
-        if current_time - self.start_time > self.duration:
-            self.kill()
+# 粒子效果：消失后放回粒子池，由 spawn_particle 复用
+class Particale(pygame.sprite.Sprite):
+    def __init__(self, pos, surf, groups, z, duration = 200):
+        super().__init__()
+        self.start(pos, surf, groups, z, duration)
+
+    def start(self, pos, surf, groups, z, duration):
+        self.image = silhouette(surf) # 白色剪影
+        self.rect = self.image.get_rect(topleft = pos)
+        self.z = z
+        self.add(groups)
+        world_timers.schedule(duration, self.release) # 到时删除
+
+    def release(self):
+        self.kill()
+        particle_pool.append(self)
+
+particle_pool = []
+
+def spawn_particle(pos, surf, groups, z, duration = 200):
+    if particle_pool:
+        particle = particle_pool.pop()
+        particle.start(pos, surf, groups, z, duration)
+        return particle
+    return Particale(pos, surf, groups, z, duration)
 
 
 class Tree(Generic):
@@ -80,10 +99,10 @@ class Tree(Generic):
         self.alive = True
         # 树桩
         stump_path = f'../graphics/stumps/{"small" if name == "Small" else "large"}.png'
-        self.stump_surf = pygame.image.load(stump_path).convert_alpha()
+        self.stump_surf = import_image(stump_path)
 
         # apples
-        self.apple_surf = pygame.image.load('../graphics/fruit/apple.png')
+        self.apple_surf = import_image('../graphics/fruit/apple.png')
         self.apple_pos = APPLE_POS[name]
         self.apple_sprites = pygame.sprite.Group()
         self.all_sprites = all_sprites
@@ -93,12 +112,12 @@ class Tree(Generic):
         self.player_add = player_add
 
         # sounds
-        self.axe_sound = pygame.mixer.Sound('../audio/axe.mp3')
+        self.axe_sound = import_sound('../audio/axe.mp3')
 
     def damage(self):
 
-        # damaging the tree
-        self.health -= 1
+        # damaging the tree（树桩也会被砍，生命值不低于0，存档中按一个字节保存）
+        self.health = max(0, self.health - 1)
 
         # play sound
         self.axe_sound.play() # 播放音效
@@ -106,7 +125,7 @@ class Tree(Generic):
         # remove an apple
         if len(self.apple_sprites.sprites()) > 0: # 树上苹果数量大于0
                 random_apple = choice(self.apple_sprites.sprites()) # 随机选择一个苹果
-                Particale(
+                spawn_particle(
                     pos = random_apple.rect.topleft,
                     surf = random_apple.image,
                     groups = self.all_sprites,
@@ -116,13 +135,18 @@ class Tree(Generic):
 
     def check_death(self):
         if self.health <= 0:
-            Particale(self.rect.topleft, self.image, self.all_sprites, LAYERS['fruit'], 300)
-            self.image = self.stump_surf # 更新树为木桩
-            self.rect = self.image.get_rect(midbottom = self.rect.midbottom)
-            self.hitbox = self.rect.copy().inflate(-10, -self.rect.height * 0.6)
-            self.alive = False
+            spawn_particle(self.rect.topleft, self.image, self.all_sprites, LAYERS['fruit'], 300)
+            self.make_stump()
             self.player_add('wood') # 获得木材
 
+    # 更新树为木桩
+    def make_stump(self):
+        self.image = self.stump_surf
+        self.rect = self.image.get_rect(midbottom = self.rect.midbottom)
+        self.hitbox = self.rect.copy().inflate(-10, -self.rect.height * 0.6)
+        refresh(self) # rect和碰撞箱改变
+        self.alive = False
+
     def update(self, dt):
         if self.alive:
             self.check_death()
@@ -133,12 +157,15 @@ class Tree(Generic):
             if randint(0,10) < 2:
                 x = pos[0] + self.rect.left
                 y = pos[1] + self.rect.top
-                # 通过访问class即Tree所在的组，来得到all_sprites，使得苹果能够被描绘
-                Generic(
-                    pos = (x,y),
-                    surf =  self.apple_surf,
-                    groups = [self.apple_sprites, self.all_sprites],
-                    z = LAYERS['fruit'])
+                self.create_apple((x,y))
+
+    def create_apple(self, pos):
+        # 通过访问class即Tree所在的组，来得到all_sprites，使得苹果能够被描绘
+        Generic(
+            pos = pos,
+            surf =  self.apple_surf,
+            groups = [self.apple_sprites, self.all_sprites],
+            z = LAYERS['fruit'])
     
     
         
\ No newline at end of file
@@ -0,0 +1,134 @@
+import os, json
+import pygame
+from settings import *
+from support import loader, import_folder, world_surfaces
+from sprites import Generic, Water, WildFlower
+
+# 世界按 CHUNK_SIZE 分块，按与玩家的距离加载、卸载：
+# 地面图、静态图层（房屋、栅栏）、水面和装饰花只保留玩家附近的块；
+# 有状态的物体（树、土壤、植物、交互区域）和碰撞箱始终常驻
+
+GROUND_CHUNK_VERSION = 1
+
+# 地面图切块：整张地面图切成块文件，只在源图改变时重新切（类似地图编译缓存）
+# 返回 {(块x, 块y): (文件路径, 是否不透明)}，完全透明的块不生成文件
+def ground_chunk_files(image_path, output_dir, chunk_size):
+    index_path = os.path.join(output_dir, 'index.json')
+    source_stat = os.stat(image_path)
+    stamp = [GROUND_CHUNK_VERSION, source_stat.st_mtime_ns, source_stat.st_size, chunk_size]
+    index = None
+    if os.path.exists(index_path):
+        try:
+            with open(index_path) as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            index = None
+
+    if not index or index.get('stamp') != stamp:
+        os.makedirs(output_dir, exist_ok = True)
+        ground = pygame.image.load(image_path)
+        chunks = []
+        for top in range(0, ground.get_height(), chunk_size):
+            for left in range(0, ground.get_width(), chunk_size):
+                area = pygame.Rect(left, top, chunk_size, chunk_size).clip(ground.get_rect())
+                piece = ground.subsurface(area)
+                if piece.get_bounding_rect().width:
+                    name = f'ground_{left // chunk_size}_{top // chunk_size}.png'
+                    pygame.image.save(piece, os.path.join(output_dir, name))
+                    # 不透明的块加载时不需要alpha通道，描绘更快
+                    opaque = pygame.mask.from_surface(piece, 254).count() == area.width * area.height
+                    chunks.append([left // chunk_size, top // chunk_size, name, opaque])
+        index = {'stamp': stamp, 'chunks': chunks}
+        with open(index_path, 'w') as file:
+            json.dump(index, file)
+
+    return {(x, y): (os.path.join(output_dir, name), opaque) for x, y, name, opaque in index['chunks']}
+
+class World:
+    def __init__(self, tmx_data, all_sprites, collision_sprites, tile_chunks):
+        self.tmx_data = tmx_data
+        self.all_sprites = all_sprites
+        self.collision_sprites = collision_sprites
+        self.tile_chunks = tile_chunks # 按块加载的静态图层（TileChunks，块边界与世界块对齐）
+        self.water_frames = import_folder('../graphics/water')
+        self.bounds = pygame.Rect(0, 0, tmx_data.width * TILE_SIZE, tmx_data.height * TILE_SIZE)
+
+        self.ground_files = ground_chunk_files(GROUND_IMAGE, GROUND_CHUNK_DIR, CHUNK_SIZE)
+        self.ground_futures = {} # 块 -> 正在后台解码的地面图
+
+        # 装饰物按所在块分组（对象数量少，只分组一次）
+        self.decorations = {}
+        for obj in tmx_data.get_layer_by_name('Decoration'):
+            self.decorations.setdefault((int(obj.x) // CHUNK_SIZE, int(obj.y) // CHUNK_SIZE), []).append(obj)
+
+        self.loaded = {} # 块 -> 该块创建的sprite
+
+    # 与区域重叠的块（限制在地图范围内）
+    def chunks_in(self, area):
+        area = area.clip(self.bounds)
+        if not area.width or not area.height:
+            return []
+        return [(x, y)
+            for y in range(area.top // CHUNK_SIZE, (area.bottom - 1) // CHUNK_SIZE + 1)
+            for x in range(area.left // CHUNK_SIZE, (area.right - 1) // CHUNK_SIZE + 1)]
+
+    # 每步模拟后调用：以玩家为中心的视口加上边距决定哪些块需要加载
+    def update(self, center):
+        view = pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+        view.center = center
+
+        # 预取：稍远的块先在后台解码地面图
+        prefetch = self.chunks_in(view.inflate(STREAM_PREFETCH_MARGIN * 2, STREAM_PREFETCH_MARGIN * 2))
+        for key in prefetch:
+            if key not in self.loaded and key not in self.ground_futures and key in self.ground_files:
+                self.ground_futures[key] = loader.submit(pygame.image.load, self.ground_files[key][0])
+        for key in set(self.ground_futures) - set(prefetch):
+            self.ground_futures.pop(key).cancel()
+
+        for key in self.chunks_in(view.inflate(STREAM_LOAD_MARGIN * 2, STREAM_LOAD_MARGIN * 2)):
+            if key not in self.loaded:
+                self.load(key)
+
+        # 卸载的距离大于加载的距离，在边界附近来回走动时不会反复加载
+        keep = set(self.chunks_in(view.inflate(STREAM_KEEP_MARGIN * 2, STREAM_KEEP_MARGIN * 2)))
+        for key in [key for key in self.loaded if key not in keep]:
+            self.unload(key)
+
+    def load(self, key):
+        area = pygame.Rect(key[0] * CHUNK_SIZE, key[1] * CHUNK_SIZE, CHUNK_SIZE, CHUNK_SIZE)
+        sprites = []
+
+        # ground
+        if key in self.ground_files:
+            path, opaque = self.ground_files[key]
+            future = self.ground_futures.pop(key, None) or loader.submit(pygame.image.load, path)
+            surf = future.result().convert() if opaque else future.result().convert_alpha()
+            ground = Generic(area.topleft, surf, self.all_sprites, LAYERS['ground'])
+            world_surfaces[ground] = surf
+            sprites.append(ground)
+
+        # 静态图层：设置该块的图块并立即烘焙
+        tile_area = (area.left // TILE_SIZE, area.top // TILE_SIZE, area.right // TILE_SIZE, area.bottom // TILE_SIZE)
+        for chunks in self.tile_chunks:
+            chunks.set_tiles([(layer, x, y, surf)
+                for layer in chunks.layers
+                for x, y, surf in self.tmx_data.get_layer_by_name(layer).tiles_in(*tile_area)])
+            chunks.bake()
+
+        # water
+        for x, y, surf in self.tmx_data.get_layer_by_name('Water').tiles_in(*tile_area):
+            sprites.append(Water((x * TILE_SIZE, y * TILE_SIZE), self.water_frames, self.all_sprites))
+
+        # wildflowers
+        for obj in self.decorations.get(key, ()):
+            sprites.append(WildFlower((obj.x, obj.y), obj.image, [self.all_sprites, self.collision_sprites]))
+
+        self.loaded[key] = sprites
+
+    def unload(self, key):
+        for sprite in self.loaded.pop(key):
+            sprite.kill()
+            world_surfaces.pop(sprite, None)
+        area = pygame.Rect(key[0] * CHUNK_SIZE, key[1] * CHUNK_SIZE, CHUNK_SIZE, CHUNK_SIZE)
+        for chunks in self.tile_chunks:
+            chunks.remove_area(area)
@@ -1,25 +1,178 @@
-from os import walk
+import json
+from os import walk, stat, cpu_count, path as os_path, sep
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pygame
 
-# 得到并返回surface_list,列表中元素即图片循环形成动画
+# 资源注册表：每个文件只加载一次，之后返回同一个共享引用（调用者不要修改）
+surfaces = {} # 路径 -> 已转换为显示格式的surface
+folders = {} # 文件夹路径 -> surface列表
+folder_dicts = {} # 文件夹路径 -> {图片名: surface}
+sounds = {} # 路径 -> LazySound
+world_surfaces = {} # 按块加载的地面图、烘焙的图块块 -> surface，不经过注册表缓存，只用于资源统计
+
+# 解码用的线程池（图片、音效的文件读取和解码不需要主线程）
+loader = ThreadPoolExecutor(max_workers = min(8, (cpu_count() or 1) + 2))
+
+def asset_key(path):
+    return os_path.normpath(path)
+
+# 加载图片（convert_alpha，显示格式）
+def import_image(path):
+    key = asset_key(path)
+    if key not in surfaces:
+        surfaces[key] = pygame.image.load(key).convert_alpha()
+    return surfaces[key]
+
+# 在线程池中解码多张图片，转换为显示格式（convert_alpha）在主线程进行；
+# 每完成一张调用 progress(完成数, 总数)，如更新加载画面
+def preload_images(paths, progress = None):
+    keys = list(dict.fromkeys(asset_key(path) for path in paths if asset_key(path) not in surfaces))
+    keys.sort(key = os_path.getsize, reverse = True) # 大文件先解码
+    futures = {loader.submit(pygame.image.load, key): key for key in keys}
+    for done, future in enumerate(as_completed(futures), 1):
+        # 转换后不再保留解码出的原始surface
+        surfaces[futures.pop(future)] = future.result().convert_alpha()
+        if progress:
+            progress(done, len(keys))
+
+# 文件夹（含子文件夹）中的所有图片
+def image_files(path):
+    return [os_path.join(folder, name) for folder, _, files in walk(path) for name in files if name.endswith('.png')]
+
+# 音效：第一次播放时才解码（或在 preload_sounds 之后于后台解码）
+class LazySound:
+    def __init__(self, path):
+        self.path = path
+        self.volume = 1.0
+        self.sound = None
+        self.future = None
+
+    def set_volume(self, volume):
+        self.volume = volume
+        if self.sound:
+            self.sound.set_volume(volume)
+
+    def load(self):
+        if self.sound is None:
+            self.sound = self.future.result() if self.future else pygame.mixer.Sound(self.path)
+            self.sound.set_volume(self.volume)
+        return self.sound
+
+    def play(self, *args, **kwargs):
+        return self.load().play(*args, **kwargs)
+
+# 加载音效，音量由调用者设置（同一文件的所有使用者共享）
+def import_sound(path):
+    key = asset_key(path)
+    if key not in sounds:
+        sounds[key] = LazySound(key)
+    return sounds[key]
+
+# 在后台解码所有已登记但还没用到的音效（第一帧之后调用）
+def preload_sounds():
+    for sound in sounds.values():
+        if sound.sound is None and sound.future is None:
+            sound.future = loader.submit(pygame.mixer.Sound, sound.path)
+
+# 背景音乐：流式播放，不整个解码到内存
+def play_music(path, volume):
+    pygame.mixer.music.load(asset_key(path))
+    pygame.mixer.music.set_volume(volume)
+    pygame.mixer.music.play(loops = -1)
+
+# 动画帧的排序：数字文件名按数值（2 在 10 之前），其余按名称
+def frame_key(name):
+    stem = name.split('.')[0]
+    return (0, int(stem), '') if stem.isdigit() else (1, 0, stem)
+
+# 得到并返回surface_list,列表中元素即图片循环形成动画（按帧序号排序，与文件系统无关）
 def import_folder(path):
-    surface_list = []
-    
-    for _, _, img_files in walk(path):
-        for image in img_files: # 图片名
-            full_path = path + '/' + image # 组合成完整路径
-            image_surf = pygame.image.load(full_path).convert_alpha() # 由路径加载图片
-            surface_list.append(image_surf)
+    key = asset_key(path)
+    if key not in folders:
+        surface_list = []
+        for _, _, img_files in walk(key):
+            for image in sorted(img_files, key = frame_key): # 图片名
+                full_path = key + '/' + image # 组合成完整路径
+                surface_list.append(import_image(full_path)) # 由路径加载图片
+        folders[key] = surface_list
 
-    return surface_list
+    return folders[key]
 
 def import_folder_dict(path):
-    surface_dict = {}
-
-    for _, _, img_files in walk(path):
-        for image in img_files: # 图片名
-            full_path = path + '/' + image # 组合成完整路径
-            image_surf = pygame.image.load(full_path).convert_alpha() # 由路径加载图片
-            surface_dict[image.split('.')[0]] = image_surf # 键 = 值，图片名去除.png
-    
-    return surface_dict        
\ No newline at end of file
+    key = asset_key(path)
+    if key not in folder_dicts:
+        surface_dict = {}
+        for _, _, img_files in walk(key):
+            for image in sorted(img_files, key = frame_key): # 图片名
+                full_path = key + '/' + image # 组合成完整路径
+                surface_dict[image.split('.')[0]] = import_image(full_path) # 键 = 值，图片名去除.png
+        folder_dicts[key] = surface_dict
+
+    return folder_dicts[key]
+
+# 图集：pack_atlas.py 离线打包的小图，运行时作为图集页的子surface登记到注册表，
+# 之后 import_image / import_folder 直接返回子surface，不再读取单独的文件
+ATLAS_VERSION = 1
+
+def load_atlas(index_path, progress = None):
+    if not os_path.exists(index_path):
+        return False
+    with open(index_path) as file:
+        index = json.load(file)
+    if index.get('version') != ATLAS_VERSION:
+        return False
+
+    # 先检查每张图的源文件，只解码仍有有效图片的图集页
+    atlas_dir = os_path.dirname(index_path)
+    valid = {}
+    for source, (page, x, y, width, height, mtime, size) in index['images'].items():
+        key = asset_key(os_path.join(atlas_dir, source))
+        try:
+            source_stat = stat(key)
+        except OSError:
+            continue
+        # 源文件在打包后改变过：图集已过期，这张图仍从文件加载
+        if key not in surfaces and (source_stat.st_mtime_ns, source_stat.st_size) == (mtime, size):
+            valid[key] = (page, (x, y, width, height))
+
+    pages = [asset_key(os_path.join(atlas_dir, page)) for page in index['pages']]
+    preload_images({pages[page] for page, _ in valid.values()}, progress)
+    for key, (page, area) in valid.items():
+        surfaces[key] = surfaces[pages[page]].subsurface(area)
+    return True
+
+# 资源分类：graphics下取前两级目录（如 graphics/character），其余取第一级（如 audio）
+def asset_category(key):
+    parts = [part for part in os_path.dirname(key).split(sep) if part != '..']
+    return '/'.join(parts[:2] if parts and parts[0] == 'graphics' else parts[:1])
+
+# 统计每类资源占用的字节数
+def asset_report():
+    report = {}
+    credited = {} # 图集页 -> 已计入各源文件夹的字节数
+    for key, surf in surfaces.items():
+        category = asset_category(key)
+        parent = surf.get_parent()
+        if parent: # 图集中的子surface：按面积计入源图片所在的类别，从图集页中扣除
+            size = surf.get_width() * surf.get_height() * parent.get_bytesize()
+            credited[parent] = credited.get(parent, 0) + size
+        else:
+            size = surf.get_pitch() * surf.get_height()
+        report[category] = report.get(category, 0) + size
+    for key, surf in surfaces.items(): # 图集页只剩下空白和已过期的图片
+        if surf in credited:
+            category = asset_category(key)
+            report[category] -= credited[surf]
+    for surf in world_surfaces.values():
+        report['graphics/world'] = report.get('graphics/world', 0) + surf.get_pitch() * surf.get_height()
+
+    if sounds and pygame.mixer.get_init():
+        frequency, size, channels = pygame.mixer.get_init()
+        for key, lazy_sound in sounds.items():
+            if lazy_sound.sound is None: # 还没解码
+                continue
+            category = asset_category(key)
+            sound_bytes = int(lazy_sound.sound.get_length() * frequency) * channels * (abs(size) // 8)
+            report[category] = report.get(category, 0) + sound_bytes
+
+    return dict(sorted(report.items()))
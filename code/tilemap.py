@@ -0,0 +1,235 @@
+import os, pickle, zlib, hashlib
+from array import array
+import pygame
+from support import import_image
+
+# 编译后的地图缓存：把 .tmx 和它引用的 .tsx 编译成紧凑的二进制文件，
+# 启动时直接读取缓存，只有源文件改变时才用 pytmx 重新解析 XML
+MAGIC = b'PDMAP'
+VERSION = 1
+
+# 图块翻转标记（与 Tiled / pytmx 一致）
+FLIP_X = 1
+FLIP_Y = 2
+FLIP_DIAGONAL = 4
+
+# 图块图层：gids 为 宽*高 的一维数组，0 表示空
+class TileLayer:
+    def __init__(self, tile_map, name, gids):
+        self.tile_map = tile_map
+        self.name = name
+        self.gids = gids
+        self.width = tile_map.width
+        self.height = tile_map.height
+
+    # 与 pytmx 相同：返回 (x, y, surf)
+    def tiles(self):
+        width = self.width
+        for index, gid in enumerate(self.gids):
+            if gid:
+                yield index % width, index // width, self.tile_map.get_image(gid)
+
+    # 区域内（图格坐标，不含right/bottom）的图块，用于按块加载
+    def tiles_in(self, left, top, right, bottom):
+        width = self.width
+        get_image = self.tile_map.get_image
+        for y in range(max(0, top), min(bottom, self.height)):
+            row = y * width
+            for x in range(max(0, left), min(right, width)):
+                gid = self.gids[row + x]
+                if gid:
+                    yield x, y, get_image(gid)
+
+    # 非空图块的掩码（按行排列的 bytes，1 表示有图块），如 Collision / Farmable
+    def mask(self):
+        return bytes(1 if gid else 0 for gid in self.gids)
+
+class MapObject:
+    def __init__(self, tile_map, name, x, y, width, height, gid):
+        self.tile_map = tile_map
+        self.name = name
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.gid = gid
+
+    @property
+    def image(self):
+        return self.tile_map.get_image(self.gid) if self.gid else None
+
+class ObjectLayer:
+    def __init__(self, name, objects):
+        self.name = name
+        self.objects = objects
+
+    def __iter__(self):
+        return iter(self.objects)
+
+class TileMap:
+    def __init__(self, path, data):
+        self.path = path
+        self.width = data['width']
+        self.height = data['height']
+        self.tile_width = data['tile_width']
+        self.tile_height = data['tile_height']
+        self.image_sources = data['images'] # gid -> (图片路径, 区域, 翻转标记) 或 None
+        self.images = {} # gid -> surface，用到时才生成
+
+        self.layers = {}
+        for layer in data['layers']:
+            if layer['type'] == 'tiles':
+                gids = array('I')
+                gids.frombytes(layer['gids'])
+                self.layers[layer['name']] = TileLayer(self, layer['name'], gids)
+            else:
+                objects = [MapObject(self, *obj) for obj in layer['objects']]
+                self.layers[layer['name']] = ObjectLayer(layer['name'], objects)
+
+    def get_layer_by_name(self, name):
+        return self.layers[name]
+
+    # 这些图层中的图块用到的图片文件（可提前在后台解码）
+    def image_files(self, layer_names):
+        gids = set()
+        for name in layer_names:
+            layer = self.layers[name]
+            gids.update(layer.gids if isinstance(layer, TileLayer) else (obj.gid for obj in layer))
+        sources = {self.image_sources[gid][0] for gid in gids if gid and self.image_sources[gid]}
+        return [os.path.join(os.path.dirname(self.path), source) for source in sorted(sources)]
+
+    # 图块surface：共享图集的子surface，按需翻转
+    def get_image(self, gid):
+        if gid not in self.images:
+            source, rect, flags = self.image_sources[gid]
+            image = import_image(os.path.join(os.path.dirname(self.path), source))
+            if rect:
+                image = image.subsurface(rect)
+            if flags & FLIP_DIAGONAL:
+                image = pygame.transform.flip(pygame.transform.rotate(image, 270), True, False)
+            if flags & (FLIP_X | FLIP_Y):
+                image = pygame.transform.flip(image, bool(flags & FLIP_X), bool(flags & FLIP_Y))
+            self.images[gid] = image
+        return self.images[gid]
+
+# 地图源文件：.tmx 本身和它引用的 .tsx
+def source_files(path):
+    import xml.etree.ElementTree as ElementTree
+    sources = [path]
+    for tileset in ElementTree.parse(path).getroot().iter('tileset'):
+        if 'source' in tileset.attrib:
+            sources.append(os.path.normpath(os.path.join(os.path.dirname(path), tileset.attrib['source'])))
+    return sources
+
+def file_stamps(sources):
+    stamps = []
+    for source in sources:
+        stat = os.stat(source)
+        stamps.append((source, stat.st_mtime_ns, stat.st_size))
+    return stamps
+
+def sources_hash(sources):
+    digest = hashlib.sha1()
+    for source in sources:
+        with open(source, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+# 用 pytmx 解析 XML（只在缓存失效时调用）
+def compile_map(path):
+    import pytmx
+
+    # 不加载图片：pytmx 默认的 image_loader 只返回 (文件名, 区域, 翻转标记)
+    tmx_data = pytmx.TiledMap(path)
+    map_dir = os.path.dirname(path)
+
+    images = [None] * len(tmx_data.images)
+    for gid, image in enumerate(tmx_data.images):
+        if image:
+            filename, rect, flags = image
+            flag_bits = 0
+            if flags:
+                flag_bits = (FLIP_X if flags.flipped_horizontally else 0) | \
+                    (FLIP_Y if flags.flipped_vertically else 0) | \
+                    (FLIP_DIAGONAL if flags.flipped_diagonally else 0)
+            source = os.path.relpath(os.path.normpath(filename), map_dir)
+            images[gid] = (source, tuple(rect) if rect else None, flag_bits)
+
+    layers = []
+    for layer in tmx_data.layers:
+        if isinstance(layer, pytmx.TiledTileLayer):
+            gids = array('I', (gid for row in layer.data for gid in row))
+            layers.append({'name': layer.name, 'type': 'tiles', 'gids': gids.tobytes()})
+        elif isinstance(layer, pytmx.TiledObjectGroup):
+            objects = [(obj.name, obj.x, obj.y, obj.width, obj.height, obj.gid) for obj in layer]
+            layers.append({'name': layer.name, 'type': 'objects', 'objects': objects})
+
+    return {
+        'width': tmx_data.width,
+        'height': tmx_data.height,
+        'tile_width': tmx_data.tilewidth,
+        'tile_height': tmx_data.tileheight,
+        'images': images,
+        'layers': layers}
+
+# 缓存文件：MAGIC + 版本 + 头部（源文件时间戳与哈希）+ 压缩后的地图数据
+def write_cache(cache_path, header, data):
+    header_bytes = pickle.dumps(header, pickle.HIGHEST_PROTOCOL)
+    body = zlib.compress(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+    temp_path = cache_path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(MAGIC)
+        file.write(VERSION.to_bytes(2, 'little'))
+        file.write(len(header_bytes).to_bytes(4, 'little'))
+        file.write(header_bytes)
+        file.write(body)
+    os.replace(temp_path, cache_path)
+
+def read_cache(cache_path):
+    with open(cache_path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC or int.from_bytes(file.read(2), 'little') != VERSION:
+            return None, None
+        header = pickle.loads(file.read(int.from_bytes(file.read(4), 'little')))
+        return header, file.read()
+
+loaded_maps = {} # 进程内缓存：同一地图只加载一次
+
+# 加载地图：优先读取编译缓存，源文件改变（时间戳变了且内容哈希也变了）时重新编译
+def load_map(path):
+    path = os.path.normpath(path)
+    if path in loaded_maps:
+        return loaded_maps[path]
+
+    cache_path = path + '.cache'
+    header, body = None, None
+    if os.path.exists(cache_path):
+        try:
+            header, body = read_cache(cache_path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            header, body = None, None
+
+    # 缓存数据损坏（截断、解压或反序列化失败）时当作没有缓存，重新编译并覆盖
+    data = None
+    if header:
+        try:
+            sources = [source for source, _, _ in header['stamps']]
+            try:
+                stamps = file_stamps(sources)
+            except OSError:
+                stamps = None
+            if stamps == header['stamps']:
+                data = pickle.loads(zlib.decompress(body))
+            elif stamps and sources_hash(sources) == header['hash']:
+                # 只是时间戳变了（如重新检出），更新头部即可
+                data = pickle.loads(zlib.decompress(body))
+                write_cache(cache_path, {'stamps': stamps, 'hash': header['hash']}, data)
+        except (zlib.error, EOFError, pickle.UnpicklingError, KeyError, TypeError, ValueError, AttributeError):
+            data = None
+
+    if data is None:
+        sources = source_files(path)
+        data = compile_map(path)
+        write_cache(cache_path, {'stamps': file_stamps(sources), 'hash': sources_hash(sources)}, data)
+
+    loaded_maps[path] = TileMap(path, data)
+    return loaded_maps[path]
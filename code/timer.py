@@ -1,23 +1,74 @@
-import pygame
+from heapq import heappush, heappop
+from itertools import count
+
+# 游戏时钟：由每帧的dt推进（毫秒），无窗口加速模拟时与真实时间无关
+class GameClock:
+    def __init__(self):
+        self.ticks = 0
+
+    def advance(self, dt):
+        self.ticks += dt * 1000
+
+game_clock = GameClock()
+
+# 定时事件，取消后留在堆中，到期时跳过
+class Event:
+    def __init__(self, callback):
+        self.callback = callback
+
+    def cancel(self):
+        self.callback = None
+
+# 调度器：事件按到期时间放在最小堆中，推进时只处理到期的事件，未到期的定时器每帧没有开销
+# 由游戏时钟的dt推进；paused 时时间不走，speed 为时间倍率
+class Scheduler:
+    def __init__(self):
+        self.ticks = 0 # 调度器时间（毫秒）
+        self.speed = 1
+        self.paused = False
+        self.queue = [] # (到期时间, 序号, 事件)，序号保证同时到期的事件按加入顺序处理
+        self.order = count()
+
+    def schedule(self, delay, callback):
+        event = Event(callback)
+        heappush(self.queue, (self.ticks + delay, next(self.order), event))
+        return event
+
+    def advance(self, dt):
+        if self.paused:
+            return
+        self.ticks += dt * 1000 * self.speed
+        queue = self.queue
+        while queue and queue[0][0] <= self.ticks:
+            callback = heappop(queue)[2].callback
+            if callback:
+                callback()
+
+world_timers = Scheduler() # 游戏世界（玩家、粒子等），打开商店时暂停
+ui_timers = Scheduler() # 界面（商店），一直运行
 
 class Timer:
-    def __init__(self,duration,func = None):
+    def __init__(self, duration, func = None, scheduler = world_timers):
         self.duration = duration
         self.func = func
-        self.start_time = 0
-        self.active = False
-    
+        self.scheduler = scheduler
+        self.event = None
+
+    @property
+    def active(self):
+        return self.event is not None
+
+    # 激活（已激活时重新计时）
     def activate(self):
-        self.active = True
-        self.start_time = pygame.time.get_ticks()
+        self.deactivate()
+        self.event = self.scheduler.schedule(self.duration, self.finish)
 
     def deactivate(self):
-        self.active = False
-        self.start_time = 0
-
-    def update(self):
-        current_time = pygame.time.get_ticks()
-        if current_time - self.start_time >= self.duration:
-            if self.func and self.start_time != 0:
-                self.func()
-            self.deactivate()
\ No newline at end of file
+        if self.event:
+            self.event.cancel()
+            self.event = None
+
+    def finish(self):
+        if self.func:
+            self.func()
+        self.event = None
@@ -1,22 +1,18 @@
-import pygame
 from settings import *
 
 class Transition:
     def __init__(self, reset, player):
         
         # set up
-        self.display_surface = pygame.display.get_surface()
         self.reset = reset
         self.player = player
 
-        # overlay image
-        self.image = pygame.Surface((SCREEN_WIDTH,SCREEN_HEIGHT))
         self.color = 255
-        self.speed = -2
+        self.speed = -TRANSITION_SPEED
 
     # 播放过渡
-    def play(self):
-        self.color += self.speed
+    def update(self, dt):
+        self.color += self.speed * dt
         if self.color <= 0:
             self.reset() # 重置
             self.color = 0
@@ -26,5 +22,7 @@ class Transition:
             self.color = 255
             self.speed *= -1
 
-        self.image.fill((self.color,self.color,self.color,))
-        self.display_surface.blit(self.image, (0,0), special_flags = pygame.BLEND_RGBA_MULT)
+    # 淡入淡出的颜色（由后期处理相乘到画面上）
+    def tint(self):
+        color = int(self.color)
+        return (color,color,color)